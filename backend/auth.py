@@ -2,18 +2,25 @@ from datetime import datetime, timedelta, timezone
 from typing import Optional
 from jose import JWTError, jwt
 from passlib.context import CryptContext
-from fastapi import Depends, HTTPException, status
+from fastapi import Depends, HTTPException, Request, status
 from fastapi.security import OAuth2PasswordBearer
+from starlette.concurrency import run_in_threadpool
 import os
 
 try:
     # Try relative imports (for deployment)
     from .models import TokenData, UserResponse
-    from .database import users_collection
+    from .database import shard_router
+    from .sharding import Shard
+    from .batching import Batcher
+    from .circuit_breaker import stale_cache
 except ImportError:
     # Fall back to absolute imports (for local development)
     from models import TokenData, UserResponse
-    from database import users_collection
+    from database import shard_router
+    from sharding import Shard
+    from batching import Batcher
+    from circuit_breaker import stale_cache
 
 # Password hashing - using argon2 as primary, bcrypt as fallback
 pwd_context = CryptContext(
@@ -48,11 +55,29 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
+def _load_users_by_email(emails):
+    """Load many users with one directory query and one $in query per shard"""
+    entries = shard_router.locate_emails(emails)
+    groups = {}
+    for email in emails:
+        groups.setdefault(shard_router.shard_for_entry(entries.get(email)), []).append(email)
+    users = {}
+    for shard, shard_emails in groups.items():
+        for user in shard.users.find({"email": {"$in": shard_emails}}):
+            # Where the user was found, so the request needs no second directory lookup
+            user["_shard"] = shard.name
+            user["_moving"] = "moving_to" in entries.get(user["email"], {})
+            users[user["email"]] = user
+    return users
+
+# Concurrent lookups of the current user share round-trips
+user_loader = Batcher(_load_users_by_email)
+
 def get_user_by_email(email: str):
-    """Get user from database by email"""
-    return users_collection.find_one({"email": email})
+    """Get user from database by email (blocking; call from a worker thread)"""
+    return user_loader.load(email)
 
-async def get_current_user(token: str = Depends(oauth2_scheme)) -> UserResponse:
+async def get_current_user(request: Request, token: str = Depends(oauth2_scheme)) -> UserResponse:
     """Get current authenticated user from JWT token"""
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
@@ -68,19 +93,41 @@ async def get_current_user(token: str = Depends(oauth2_scheme)) -> UserResponse:
     except JWTError:
         raise credentials_exception
 
-    user = get_user_by_email(email=token_data.email)
-    if user is None:
-        raise credentials_exception
+    def load():
+        user = get_user_by_email(token_data.email)
+        if user is None:
+            return None, None, False
+        return UserResponse(
+            id=str(user["_id"]),
+            email=user["email"],
+            full_name=user["full_name"],
+            is_active=user.get("is_active", True)
+        ), user["_shard"], user["_moving"]
 
-    return UserResponse(
-        id=str(user["_id"]),
-        email=user["email"],
-        full_name=user["full_name"],
-        is_active=user.get("is_active", True)
-    )
+    # Stale-serving endpoints still need to know who is asking while the database is down
+    current_user, shard_name, moving = await run_in_threadpool(stale_cache.serve, ("user", token_data.email), load)
+    if current_user is None:
+        raise credentials_exception
+    request.state.user_shard = shard_name
+    request.state.user_moving = moving
+    return current_user
 
 async def get_current_active_user(current_user: UserResponse = Depends(get_current_user)) -> UserResponse:
     """Ensure the current user is active"""
     if not current_user.is_active:
         raise HTTPException(status_code=400, detail="Inactive user")
     return current_user
+
+def get_current_user_shard(request: Request, current_user: UserResponse = Depends(get_current_active_user)) -> Shard:
+    """Shard holding the current user's habits and activity (found by the user lookup)"""
+    return shard_router.shards[request.state.user_shard]
+
+def get_writable_user_shard(request: Request, shard: Shard = Depends(get_current_user_shard)) -> Shard:
+    """Like get_current_user_shard, but refuses while the rebalancer is moving the user"""
+    if request.state.user_moving:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Account is being moved, please retry shortly",
+            headers={"Retry-After": "5"},
+        )
+    return shard
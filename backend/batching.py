@@ -0,0 +1,126 @@
+"""
+DataLoader-style batching of concurrent lookups
+
+Handlers run in a thread pool, so concurrent requests each calling find_one would
+each pay a MongoDB round-trip. A Batcher collects the keys requested while a
+previous batch is still on its way to the database (or within max_wait of that)
+and loads them with one $in query, then hands each caller its own result.
+
+When nothing else is in flight a lookup is dispatched immediately, so batching
+only kicks in under concurrency and adds no latency at low load.
+
+A batch serves several requests, so it does not run under whichever caller
+happened to dispatch it: load_many gets a fresh context with the latest of the
+callers' deadlines (none if any caller has none), and every caller stops
+waiting when its own deadline runs out.
+"""
+import contextvars
+import os
+import threading
+import time
+from concurrent.futures import Future, TimeoutError as FutureTimeout
+from typing import Any, Callable, Dict, Hashable, Iterable, List, Optional, Tuple
+
+try:
+    # Try relative imports (for deployment)
+    from .deadline import DeadlineExceeded, current, remaining, request_deadline
+except ImportError:
+    # Fall back to absolute imports (for local development)
+    from deadline import DeadlineExceeded, current, remaining, request_deadline
+
+MAX_BATCH_SIZE = int(os.getenv("LOOKUP_BATCH_MAX_SIZE", "100"))
+MAX_WAIT = float(os.getenv("LOOKUP_BATCH_MAX_WAIT_MS", "2")) / 1000
+
+
+class _Batch:
+    def __init__(self):
+        self.futures: Dict[Hashable, Future] = {}
+        self.full = threading.Event()
+        # Each caller's (deadline, caller_chosen), None for a caller without one
+        self.deadlines: List[Optional[Tuple[float, bool]]] = []
+
+    def deadline(self) -> Optional[Tuple[float, bool]]:
+        """The latest of the callers' deadlines, or None if any caller has none"""
+        if not self.deadlines or None in self.deadlines:
+            return None
+        return max(self.deadlines)
+
+
+class Batcher:
+    def __init__(
+        self,
+        load_many: Callable[[Iterable[Hashable]], Dict[Hashable, Any]],
+        max_batch_size: int = MAX_BATCH_SIZE,
+        max_wait: float = MAX_WAIT
+    ):
+        """
+        load_many: loads a list of keys, returns {key: value}; missing keys resolve to None
+        max_batch_size: a batch is dispatched as soon as it holds this many keys
+        max_wait: seconds a batch waits for more keys while another batch is in flight
+        """
+        self.load_many = load_many
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self._lock = threading.Lock()
+        self._pending = None
+        self._in_flight = 0
+        # Counters for benchmarks and debugging
+        self.loads = 0
+        self.batches = 0
+
+    def load(self, key: Hashable) -> Any:
+        """Look up one key, sharing a database round-trip with concurrent callers"""
+        with self._lock:
+            self.loads += 1
+            batch = self._pending
+            leader = batch is None
+            if leader:
+                batch = self._pending = _Batch()
+            future = batch.futures.get(key)
+            if future is None:
+                future = batch.futures[key] = Future()
+            batch.deadlines.append(current())
+            if len(batch.futures) >= self.max_batch_size:
+                self._pending = None
+                batch.full.set()
+            busy = self._in_flight > 0
+
+        if leader:
+            if busy:
+                batch.full.wait(self.max_wait)
+            self._dispatch(batch)
+
+        try:
+            return future.result(timeout=remaining())
+        except FutureTimeout:
+            raise DeadlineExceeded(f"Deadline passed waiting for a batched lookup of {key!r}") from None
+
+    def _dispatch(self, batch: _Batch):
+        with self._lock:
+            if self._pending is batch:
+                self._pending = None
+            self._in_flight += 1
+            self.batches += 1
+
+        try:
+            # A fresh context: the dispatching caller's pymongo.timeout must not apply
+            results = contextvars.Context().run(self._load, list(batch.futures), batch.deadline())
+        except Exception as e:
+            for future in batch.futures.values():
+                future.set_exception(e)
+        else:
+            for key, future in batch.futures.items():
+                future.set_result(results.get(key))
+        finally:
+            with self._lock:
+                self._in_flight -= 1
+
+    def _load(self, keys: List[Hashable], deadline: Optional[Tuple[float, bool]]) -> Dict[Hashable, Any]:
+        if deadline is None:
+            return self.load_many(keys)
+        at, caller_chosen = deadline
+        left = at - time.monotonic()
+        if left <= 0:
+            raise DeadlineExceeded(f"Deadline passed before a batched lookup of {len(keys)} keys")
+        with request_deadline(left, caller_chosen):
+            return self.load_many(keys)
@@ -0,0 +1,98 @@
+"""
+Batcher against unbatched lookups, with a simulated database
+
+--threads threads (the handler thread pool) each look up --lookups random keys.
+The simulated load_many sleeps --latency-ms per round-trip plus --per-key-us per
+key, and at most --pool round-trips run at once, like a MongoClient connection
+pool. The baseline sends every lookup as its own round-trip; the batched run goes
+through Batcher. Prints lookups/sec, round-trips (batches)/sec, keys per batch
+and p50/p99 lookup latency for both.
+
+Usage:
+    python bench_batching.py
+    python bench_batching.py --threads 64 --latency-ms 2 --pool 20
+"""
+import argparse
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    # Try relative imports (for deployment)
+    from .batching import Batcher
+except ImportError:
+    # Fall back to absolute imports (for local development)
+    from batching import Batcher
+
+
+class SimulatedDatabase:
+    """load_many with fixed round-trip latency and a bounded connection pool"""
+
+    def __init__(self, latency: float, per_key: float, pool: int):
+        self.latency = latency
+        self.per_key = per_key
+        self._pool = threading.Semaphore(pool)
+        self._lock = threading.Lock()
+        self.round_trips = 0
+
+    def load_many(self, keys):
+        keys = list(keys)
+        with self._pool:
+            time.sleep(self.latency + self.per_key * len(keys))
+        with self._lock:
+            self.round_trips += 1
+        return {key: {"_id": key} for key in keys}
+
+
+def _run(lookup, threads: int, lookups: int, keys: int):
+    """Run lookups from a thread pool; returns (elapsed seconds, sorted latencies)"""
+    def worker(seed):
+        rng = random.Random(seed)
+        latencies = []
+        for _ in range(lookups):
+            start = time.perf_counter()
+            lookup(rng.randrange(keys))
+            latencies.append(time.perf_counter() - start)
+        return latencies
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(threads) as pool:
+        results = list(pool.map(worker, range(threads)))
+    elapsed = time.perf_counter() - start
+    return elapsed, sorted(l for result in results for l in result)
+
+def _percentile(sorted_values, fraction: float) -> float:
+    return sorted_values[max(int(len(sorted_values) * fraction) - 1, 0)]
+
+def _report(name: str, elapsed: float, latencies, round_trips: int):
+    print(
+        f"{name:>9}  {len(latencies) / elapsed:>10.0f}  {round_trips / elapsed:>10.0f}  "
+        f"{len(latencies) / round_trips:>9.1f}  {_percentile(latencies, 0.5) * 1000:>7.2f}  "
+        f"{_percentile(latencies, 0.99) * 1000:>7.2f}"
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark Batcher against one round-trip per lookup")
+    parser.add_argument("--threads", type=int, default=40, help="concurrent callers (AnyIO's default pool is 40)")
+    parser.add_argument("--lookups", type=int, default=200, help="lookups per thread")
+    parser.add_argument("--keys", type=int, default=10000, help="distinct keys")
+    parser.add_argument("--latency-ms", type=float, default=1.0, help="simulated round-trip time")
+    parser.add_argument("--per-key-us", type=float, default=5.0, help="simulated cost per key in a batch")
+    parser.add_argument("--pool", type=int, default=10, help="round-trips that may run at once")
+    args = parser.parse_args()
+
+    def database():
+        return SimulatedDatabase(args.latency_ms / 1000, args.per_key_us / 1_000_000, args.pool)
+
+    print(f"{'':>9}  {'lookups/s':>10}  {'batches/s':>10}  {'keys/batch':>9}  {'p50 ms':>7}  {'p99 ms':>7}")
+
+    unbatched = database()
+    elapsed, latencies = _run(lambda key: unbatched.load_many([key]).get(key), args.threads, args.lookups, args.keys)
+    _report("unbatched", elapsed, latencies, unbatched.round_trips)
+
+    batched = database()
+    batcher = Batcher(batched.load_many)
+    elapsed, latencies = _run(batcher.load, args.threads, args.lookups, args.keys)
+    _report("batched", elapsed, latencies, batched.round_trips)
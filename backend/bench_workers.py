@@ -0,0 +1,94 @@
+"""
+Throughput of the production server by worker count
+
+Starts gunicorn (gunicorn.conf.py) with each WEB_CONCURRENCY in --workers, drives
+it from --clients client processes over keep-alive connections for --seconds and
+prints requests/sec and p99 latency. The default path needs no database; with
+MONGO_URI pointing at a real database, --path /auth/login --body '{...}' measures
+the argon2-bound login path instead.
+
+Usage:
+    python bench_workers.py
+    python bench_workers.py --workers 1 2 4 8 --clients 32 --seconds 10
+"""
+import argparse
+import http.client
+import multiprocessing
+import os
+import signal
+import subprocess
+import sys
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_PATH = "/"
+
+
+def _wait_ready(port: int, timeout: float = 60):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            conn = http.client.HTTPConnection("127.0.0.1", port, timeout=1)
+            conn.request("GET", "/healthz")
+            if conn.getresponse().status == 200:
+                return
+        except OSError:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError(f"Server on port {port} did not come up")
+
+def _client(args):
+    """One client process: sequential requests on one connection, returns latencies"""
+    port, path, body, seconds = args
+    conn = http.client.HTTPConnection("127.0.0.1", port, timeout=30)
+    headers = {"Content-Type": "application/json"} if body else {}
+    latencies = []
+    end = time.monotonic() + seconds
+    while time.monotonic() < end:
+        start = time.perf_counter()
+        conn.request("POST" if body else "GET", path, body=body, headers=headers)
+        conn.getresponse().read()
+        latencies.append(time.perf_counter() - start)
+    conn.close()
+    return latencies
+
+def run(workers: int, clients: int, seconds: float, port: int, path: str, body: str):
+    """Requests/sec and p99 latency (ms) for one worker count"""
+    env = dict(os.environ, WEB_CONCURRENCY=str(workers), PORT=str(port))
+    # Startup creates indexes; without a reachable MongoDB give up on that quickly
+    env.setdefault("MONGO_SERVER_SELECTION_TIMEOUT_MS", "200")
+    server = subprocess.Popen(
+        [sys.executable, "-m", "gunicorn", "-c", "gunicorn.conf.py", "main:app"],
+        cwd=BACKEND_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    try:
+        _wait_ready(port)
+        # Warm up every worker before measuring
+        with multiprocessing.Pool(clients) as pool:
+            pool.map(_client, [(port, path, body, 1)] * clients)
+            results = pool.map(_client, [(port, path, body, seconds)] * clients)
+    finally:
+        server.send_signal(signal.SIGINT)
+        server.wait(timeout=60)
+
+    latencies = sorted(l for result in results for l in result)
+    p99 = latencies[int(len(latencies) * 0.99) - 1] * 1000 if latencies else 0.0
+    return len(latencies) / seconds, p99
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark throughput by gunicorn worker count")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--clients", type=int, default=16, help="concurrent client processes")
+    parser.add_argument("--seconds", type=float, default=5)
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--path", default=DEFAULT_PATH)
+    parser.add_argument("--body", default="", help="JSON body to POST (GET when empty)")
+    args = parser.parse_args()
+
+    print(f"{'workers':>7}  {'req/s':>9}  {'p99 ms':>8}  {'speedup':>7}")
+    baseline = None
+    for workers in args.workers:
+        rps, p99 = run(workers, args.clients, args.seconds, args.port, args.path, args.body)
+        baseline = baseline or rps
+        print(f"{workers:>7}  {rps:>9.1f}  {p99:>8.1f}  {rps / baseline:>6.2f}x")
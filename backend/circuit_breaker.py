@@ -0,0 +1,248 @@
+"""
+Circuit breakers for the database backends
+
+Each backend (a shard's cluster, or the Data API) gets a CircuitBreaker. After
+CIRCUIT_FAILURE_THRESHOLD consecutive connection errors or timeouts (other than a
+caller-shortened request deadline running out, see deadline.py) the circuit
+opens and calls fail immediately with CircuitOpenError instead of waiting on a
+sick cluster. After CIRCUIT_RESET_SECONDS one probe call is let through; success
+closes the circuit, failure opens it again.
+
+GuardedCollection wraps a pymongo collection so every call (and every cursor
+fetch) goes through the breaker. StaleCache lets read endpoints answer with the
+last good result while the backend is unavailable (SERVE_STALE_ON_ERROR=1).
+"""
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Hashable
+
+from pymongo.cursor import Cursor
+from pymongo.command_cursor import CommandCursor
+from pymongo.errors import ConnectionFailure, ExecutionTimeout
+
+try:
+    # Try relative imports (for deployment)
+    from .deadline import DeadlineExceeded, caller_budget_exhausted
+except ImportError:
+    # Fall back to absolute imports (for local development)
+    from deadline import DeadlineExceeded, caller_budget_exhausted
+
+FAILURE_THRESHOLD = int(os.getenv("CIRCUIT_FAILURE_THRESHOLD", "5"))
+RESET_TIMEOUT = float(os.getenv("CIRCUIT_RESET_SECONDS", "10"))
+SERVE_STALE = os.getenv("SERVE_STALE_ON_ERROR", "0") == "1"
+STALE_CACHE_SIZE = int(os.getenv("STALE_CACHE_SIZE", "10000"))
+
+# Cursor methods that only describe the query; the round-trip happens on iteration
+_LAZY_METHODS = {"find", "find_raw_batches"}
+
+
+class BackendUnavailable(Exception):
+    """The database could not be used for this request"""
+
+
+class CircuitOpenError(BackendUnavailable):
+    """Raised without touching the backend while its circuit is open"""
+
+
+def is_backend_failure(exc: BaseException) -> bool:
+    """Connection errors and timeouts count against a breaker; query errors do not"""
+    return (
+        isinstance(exc, (BackendUnavailable, DeadlineExceeded, ConnectionFailure, ExecutionTimeout))
+        or getattr(exc, "timeout", False) is True
+    )
+
+
+class CircuitBreaker:
+    def __init__(
+        self,
+        name: str,
+        failure_threshold: int = FAILURE_THRESHOLD,
+        reset_timeout: float = RESET_TIMEOUT,
+        is_failure: Callable[[BaseException], bool] = is_backend_failure
+    ):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.is_failure = is_failure
+        self.state = "closed"
+        self.failures = 0
+        self._opened_at = 0.0
+        self._probing = False
+        self._lock = threading.Lock()
+
+    def allow(self):
+        """Raise CircuitOpenError unless a call may go to the backend now"""
+        with self._lock:
+            if self.state == "closed":
+                return
+            if self.state == "open" and time.monotonic() - self._opened_at >= self.reset_timeout:
+                self.state = "half_open"
+            if self.state == "half_open" and not self._probing:
+                self._probing = True
+                return
+            raise CircuitOpenError(f"{self.name} is unavailable (circuit open)")
+
+    def record_success(self):
+        with self._lock:
+            self.state = "closed"
+            self.failures = 0
+            self._probing = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.state == "half_open" or self.failures >= self.failure_threshold:
+                if self.state != "open":
+                    print(f"Circuit for {self.name} opened after {self.failures} failures")
+                self.state = "open"
+                self._opened_at = time.monotonic()
+            self._probing = False
+
+    def release(self):
+        """Record a call whose outcome says nothing about the backend"""
+        with self._lock:
+            self._probing = False
+
+    def record(self, exc: BaseException):
+        """Record the outcome of a call that raised"""
+        if self.is_failure(exc):
+            if caller_budget_exhausted():
+                # The caller's own short budget ran out, not the backend
+                self.release()
+            else:
+                self.record_failure()
+        else:
+            # The backend answered, it just didn't like the request
+            self.record_success()
+
+    def call(self, fn: Callable, *args, **kwargs):
+        self.allow()
+        try:
+            result = fn(*args, **kwargs)
+        except Exception as e:
+            self.record(e)
+            raise
+        self.record_success()
+        return result
+
+
+class GuardedCursor:
+    """Cursor whose fetches go through a breaker"""
+
+    def __init__(self, cursor, breaker: CircuitBreaker):
+        self._cursor = cursor
+        self._breaker = breaker
+        self._fetched = False
+        self._settled = False
+
+    def __getattr__(self, name):
+        attr = getattr(self._cursor, name)
+        if not callable(attr):
+            return attr
+
+        def chained(*args, **kwargs):
+            result = attr(*args, **kwargs)
+            # sort(), limit() etc. return the cursor itself
+            return self if result is self._cursor else result
+        return chained
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        try:
+            doc = next(self._cursor)
+        except StopIteration:
+            self._settled = True
+            self._breaker.record_success()
+            raise
+        except Exception as e:
+            self._settled = True
+            self._breaker.record(e)
+            raise
+        self._fetched = True
+        return doc
+
+    def close(self):
+        """Close the cursor; one dropped before it was used up still settles the breaker"""
+        self._cursor.close()
+        if not self._settled:
+            self._settled = True
+            if self._fetched:
+                self._breaker.record_success()
+            else:
+                # Never reached the backend: give back a half-open probe slot
+                self._breaker.release()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class GuardedCollection:
+    """Collection whose calls go through a breaker"""
+
+    def __init__(self, collection, breaker: CircuitBreaker):
+        self._collection = collection
+        self._breaker = breaker
+
+    def __getattr__(self, name):
+        attr = getattr(self._collection, name)
+        if not callable(attr):
+            return attr
+
+        def guarded(*args, **kwargs):
+            if name in _LAZY_METHODS:
+                self._breaker.allow()
+                try:
+                    result = attr(*args, **kwargs)
+                except Exception as e:
+                    self._breaker.record(e)
+                    raise
+                if not isinstance(result, (Cursor, CommandCursor)):
+                    # A stand-in that answered eagerly: the call is already complete
+                    self._breaker.record_success()
+            else:
+                result = self._breaker.call(attr, *args, **kwargs)
+            if isinstance(result, (Cursor, CommandCursor)):
+                return GuardedCursor(result, self._breaker)
+            return result
+        return guarded
+
+
+class StaleCache:
+    """Last good result per key, served while the backend is unavailable"""
+
+    def __init__(self, enabled: bool = SERVE_STALE, max_entries: int = STALE_CACHE_SIZE):
+        self.enabled = enabled
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def serve(self, key: Hashable, compute: Callable[[], Any]) -> Any:
+        """compute() and remember the result; fall back to the last result on backend failure"""
+        if not self.enabled:
+            return compute()
+        try:
+            result = compute()
+        except Exception as e:
+            if not is_backend_failure(e):
+                raise
+            with self._lock:
+                if key not in self._entries:
+                    raise
+                return self._entries[key]
+
+        with self._lock:
+            self._entries[key] = result
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return result
+
+
+stale_cache = StaleCache()
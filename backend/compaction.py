@@ -0,0 +1,107 @@
+"""
+days_log retention and compaction
+
+Rows older than the retention horizon are folded into one summary document per
+user per year ({user_id, year, count, active_days, compacted_through}) and then
+deleted in batches. Each batch bumps the summary and advances compacted_through
+in a single update, so a run that dies half way can simply be started again.
+
+Run periodically with:  python compaction.py
+"""
+import os
+from datetime import date, datetime, timedelta, timezone
+from typing import Optional
+
+try:
+    # Try relative imports (for deployment)
+    from .database import shard_router
+except ImportError:
+    # Fall back to absolute imports (for local development)
+    from database import shard_router
+
+# The heatmap shows the last 365 days, so never compact anything inside that window
+MIN_RETENTION_DAYS = 365
+RETENTION_DAYS = int(os.getenv("DAYS_LOG_RETENTION_DAYS", "400"))
+BATCH_SIZE = int(os.getenv("DAYS_LOG_COMPACTION_BATCH_SIZE", "500"))
+
+
+def retention_cutoff(retention_days: int = RETENTION_DAYS, today: Optional[date] = None) -> str:
+    """First date (YYYY-MM-DD) that is kept as raw days_log rows"""
+    if retention_days < MIN_RETENTION_DAYS:
+        raise ValueError(f"retention_days must be at least {MIN_RETENTION_DAYS}")
+    today = today or datetime.now(timezone.utc).date()
+    return str(today - timedelta(days=retention_days))
+
+def compact_user_year(shard, user_id: str, year: str, cutoff: str, batch_size: int = BATCH_SIZE) -> int:
+    """Fold one user's rows for one year (before cutoff) into its summary. Returns rows removed."""
+    start = f"{year}-01-01"
+    upper = min(f"{int(year) + 1}-01-01", cutoff)
+    summary = shard.days_log_summaries.find_one({"user_id": user_id, "year": year})
+    through = summary.get("compacted_through") if summary else None
+
+    # Rows already counted by an interrupted run are still lying around below the mark
+    removed = 0
+    if through:
+        removed += shard.days_log.delete_many({"user_id": user_id, "date": {"$gte": start, "$lte": through}}).deleted_count
+
+    while True:
+        lower = {"$gt": through} if through else {"$gte": start}
+        # Group by date so a batch never splits the rows of one day
+        days = list(shard.days_log.aggregate([
+            {"$match": {"user_id": user_id, "date": {**lower, "$lt": upper}}},
+            {"$group": {"_id": "$date", "count": {"$sum": 1}}},
+            {"$sort": {"_id": 1}},
+            {"$limit": batch_size},
+        ]))
+        if not days:
+            break
+
+        through = days[-1]["_id"]
+        shard.days_log_summaries.update_one(
+            {"user_id": user_id, "year": year},
+            {
+                "$inc": {"count": sum(d["count"] for d in days), "active_days": len(days)},
+                "$set": {"compacted_through": through, "updated_at": datetime.now(timezone.utc)},
+            },
+            upsert=True
+        )
+        removed += shard.days_log.delete_many({"user_id": user_id, "date": {"$gte": start, "$lte": through}}).deleted_count
+
+    return removed
+
+def compact_days_log(retention_days: int = RETENTION_DAYS, batch_size: int = BATCH_SIZE) -> int:
+    """Compact every user's days_log rows older than the retention horizon. Returns rows removed."""
+    cutoff = retention_cutoff(retention_days)
+    removed = 0
+
+    for shard in shard_router.shards.values():
+        for user_id in shard.days_log.distinct("user_id", {"date": {"$lt": cutoff}}):
+            if shard_router.is_moving(user_id):
+                # Its rows are being copied to another shard; compact them there next run
+                continue
+            while True:
+                oldest = shard.days_log.find_one(
+                    {"user_id": user_id, "date": {"$lt": cutoff}},
+                    {"date": 1},
+                    sort=[("date", 1)]
+                )
+                if not oldest:
+                    break
+                year_removed = compact_user_year(shard, user_id, oldest["date"][:4], cutoff, batch_size)
+                if not year_removed:
+                    break
+                removed += year_removed
+
+    return removed
+
+def compacted_totals(shard, user_id: str, session=None) -> dict:
+    """Sum of compacted row counts and active days for a user"""
+    totals = {"count": 0, "active_days": 0}
+    for summary in shard.days_log_summaries.find({"user_id": user_id}, {"count": 1, "active_days": 1}, session=session):
+        totals["count"] += summary.get("count", 0)
+        totals["active_days"] += summary.get("active_days", 0)
+    return totals
+
+
+if __name__ == "__main__":
+    print(f"Compacted {compact_days_log()} days_log rows older than {RETENTION_DAYS} days")
@@ -1,30 +1,134 @@
 from pymongo import MongoClient
+from pymongo.read_preferences import Nearest, Primary, PrimaryPreferred, Secondary, SecondaryPreferred
 import os
 from dotenv import load_dotenv
 import certifi
 
+try:
+    # Try relative imports (for deployment)
+    from .sharding import ShardRouter
+    from .fault_injection import FaultyDatabase, injector
+except ImportError:
+    # Fall back to absolute imports (for local development)
+    from sharding import ShardRouter
+    from fault_injection import FaultyDatabase, injector
+
 load_dotenv()
 
 MONGO_URI = os.getenv("MONGO_URI")
 DB_NAME = os.getenv("DB_NAME", "habit_garden")
+# Optional user sharding, e.g. "s0=habit_garden,s1=habit_garden_1". The first shard is
+# the home shard (directory, reset tokens, pre-sharding users). A shard on another
+# cluster sets MONGO_URI_<NAME>, otherwise it shares MONGO_URI.
+MONGO_SHARDS = os.getenv("MONGO_SHARDS", "")
+# Read preference for read-heavy endpoints (calendar, insights, habit list, history).
+# Writes always go to the primary. Max staleness must be at least 90s when set.
+MONGO_READ_PREFERENCE = os.getenv("MONGO_READ_PREFERENCE", "primary")
+MONGO_MAX_STALENESS_SECONDS = int(os.getenv("MONGO_MAX_STALENESS_SECONDS", "-1"))
+# Upper bounds for work outside a request; inside a request the deadline budget
+# (deadline.py) takes over through pymongo.timeout
+MONGO_SERVER_SELECTION_TIMEOUT_MS = int(os.getenv("MONGO_SERVER_SELECTION_TIMEOUT_MS", "5000"))
+MONGO_CONNECT_TIMEOUT_MS = int(os.getenv("MONGO_CONNECT_TIMEOUT_MS", "5000"))
+MONGO_SOCKET_TIMEOUT_MS = int(os.getenv("MONGO_SOCKET_TIMEOUT_MS", "10000"))
 
 if not MONGO_URI:
     raise RuntimeError("MONGO_URI is not set. Add it to backend/.env")
 
-# MongoDB client with SSL certificate configuration
-client = MongoClient(
-    MONGO_URI,
-    tlsCAFile=certifi.where(),
-    serverSelectionTimeoutMS=30000,
-    connectTimeoutMS=30000,
-    socketTimeoutMS=30000
-)
-
-db = client[DB_NAME]
-days_log_collection = db["days_log"]
-habits_collection = db["habits"]
-users_collection = db["users"]
-reset_tokens_collection = db["reset_tokens"]
+
+def _shard_config():
+    """List of (shard name, uri, database name)"""
+    if not MONGO_SHARDS:
+        return [("default", MONGO_URI, DB_NAME)]
+    shards = []
+    for entry in MONGO_SHARDS.split(","):
+        name, _, db_name = entry.strip().partition("=")
+        shards.append((name, os.getenv(f"MONGO_URI_{name.upper()}", MONGO_URI), db_name or name))
+    return shards
+
+def _read_preference():
+    modes = {
+        "primaryPreferred": PrimaryPreferred,
+        "secondary": Secondary,
+        "secondaryPreferred": SecondaryPreferred,
+        "nearest": Nearest,
+    }
+    if MONGO_READ_PREFERENCE == "primary":
+        return Primary()
+    if MONGO_READ_PREFERENCE not in modes:
+        raise RuntimeError(f"Unknown MONGO_READ_PREFERENCE: {MONGO_READ_PREFERENCE}")
+    return modes[MONGO_READ_PREFERENCE](max_staleness=MONGO_MAX_STALENESS_SECONDS)
+
+# One client per cluster, shared by the shards that live on it
+_clients = {}
+
+def _client(uri: str) -> MongoClient:
+    if uri not in _clients:
+        # MongoDB client with SSL certificate configuration. connect=False keeps the
+        # preloading parent process from opening sockets or monitor threads before fork.
+        _clients[uri] = MongoClient(
+            uri,
+            connect=False,
+            tlsCAFile=certifi.where(),
+            serverSelectionTimeoutMS=MONGO_SERVER_SELECTION_TIMEOUT_MS,
+            connectTimeoutMS=MONGO_CONNECT_TIMEOUT_MS,
+            socketTimeoutMS=MONGO_SOCKET_TIMEOUT_MS
+        )
+    return _clients[uri]
+
+def _with_faults(db):
+    """Wrap a database in the fault-injecting stand-in when FAULT_INJECTION_* is set"""
+    return FaultyDatabase(db, injector) if injector.enabled else db
+
+def _shard_databases():
+    return {name: _with_faults(_client(uri)[db_name]) for name, uri, db_name in _shard_config()}
+
+def _read_databases():
+    read_preference = _read_preference()
+    return {
+        name: _with_faults(_client(uri).get_database(db_name, read_preference=read_preference))
+        for name, uri, db_name in _shard_config()
+    }
+
+client = _client(MONGO_URI)
+shard_router = ShardRouter(_shard_databases(), read_databases=_read_databases())
+
+def _bind_home_collections():
+    """Collections on the home shard (the only shard unless MONGO_SHARDS is set)"""
+    global db, days_log_collection, habits_collection, users_collection, reset_tokens_collection, user_directory_collection
+    home = shard_router.home
+    db = home.db
+    days_log_collection = home.days_log
+    habits_collection = home.habits
+    users_collection = home.users
+    reset_tokens_collection = home.reset_tokens
+    user_directory_collection = home.user_directory
+
+_bind_home_collections()
+
+def reconnect():
+    """
+    Give this process its own MongoClients. MongoClient is not fork-safe, so each
+    worker of a preloading server calls this right after fork.
+    """
+    global client
+    _clients.clear()
+    client = _client(MONGO_URI)
+    shard_router.configure(_shard_databases(), read_databases=_read_databases())
+    _bind_home_collections()
+
+def close_clients():
+    """Close every MongoClient (on shutdown)"""
+    for mongo_client in _clients.values():
+        mongo_client.close()
+
+def ping() -> bool:
+    """True if every shard's cluster answers a ping"""
+    try:
+        for shard in shard_router.shards.values():
+            shard.db.command("ping")
+        return True
+    except Exception:
+        return False
 
 # Initialize indexes (only create if they don't exist)
 _indexes_initialized = False
@@ -36,13 +140,32 @@ def ensure_indexes():
         return
 
     try:
-        # Create unique index on email for users collection
-        users_collection.create_index("email", unique=True)
+        for shard in shard_router.shards.values():
+            # Create unique index on email for users collection
+            shard.users.create_index("email", unique=True)
+            # One completion event per habit per day, and one rollup per habit per week/month
+            shard.habit_events.create_index([("habit_id", 1), ("date", 1)], unique=True)
+            shard.habit_rollups.create_index([("habit_id", 1), ("key", 1)], unique=True)
+            # Calendar reads a date window per user; compacted years live in one summary per user per year
+            shard.days_log.create_index([("user_id", 1), ("date", 1)])
+            shard.days_log_summaries.create_index([("user_id", 1), ("year", 1)], unique=True)
+
         # Create index on token for reset_tokens collection
         reset_tokens_collection.create_index("token", unique=True)
         # Create TTL index to auto-delete expired reset tokens after 1 hour
         reset_tokens_collection.create_index("created_at", expireAfterSeconds=3600)
+        if shard_router.sharded:
+            # Login resolves a user's shard by email
+            user_directory_collection.create_index("email", unique=True)
         _indexes_initialized = True
     except Exception as e:
         # Log but don't fail if indexes already exist
         print(f"Index creation skipped or failed (might already exist): {e}")
+
+def ensure_directory():
+    """Give pre-sharding users directory entries once MONGO_SHARDS is enabled"""
+    try:
+        shard_router.ensure_directory()
+    except Exception as e:
+        # Signup keeps checking the home shard until the backfill has completed
+        print(f"User directory backfill failed: {e}")
@@ -7,6 +7,15 @@ import requests
 from typing import Optional, Dict, Any, List
 from dotenv import load_dotenv
 
+try:
+    # Try relative imports (for deployment)
+    from .circuit_breaker import CircuitBreaker
+    from .deadline import remaining, DeadlineExceeded
+except ImportError:
+    # Fall back to absolute imports (for local development)
+    from circuit_breaker import CircuitBreaker
+    from deadline import remaining, DeadlineExceeded
+
 load_dotenv()
 
 # MongoDB Data API configuration
@@ -14,11 +23,24 @@ DATA_API_URL = os.getenv("MONGODB_DATA_API_URL")
 DATA_API_KEY = os.getenv("MONGODB_DATA_API_KEY")
 DB_NAME = os.getenv("DB_NAME", "habit_garden")
 CLUSTER_NAME = os.getenv("CLUSTER_NAME", "ClusterSpaceShare")
+# Cap per call; inside a request the remaining deadline budget is used if smaller
+DATA_API_TIMEOUT_SECONDS = float(os.getenv("DATA_API_TIMEOUT_SECONDS", "5"))
 
 if not DATA_API_URL or not DATA_API_KEY:
     raise RuntimeError("MONGODB_DATA_API_URL and MONGODB_DATA_API_KEY must be set")
 
 
+def _is_data_api_failure(exc: BaseException) -> bool:
+    """Timeouts, connection errors and 5xx responses count against the breaker"""
+    if isinstance(exc, (requests.Timeout, requests.ConnectionError, DeadlineExceeded)):
+        return True
+    response = getattr(exc, "response", None)
+    return isinstance(exc, requests.HTTPError) and response is not None and response.status_code >= 500
+
+# All collections share one Data API endpoint, so they share one breaker
+data_api_breaker = CircuitBreaker("MongoDB Data API", is_failure=_is_data_api_failure)
+
+
 class HTTPCollection:
     """HTTP-based MongoDB collection wrapper using Data API"""
 
@@ -39,9 +61,16 @@ class HTTPCollection:
         url = f"{DATA_API_URL}/action/{action}"
         full_payload = {**self.base_payload, **payload}
 
-        response = requests.post(url, json=full_payload, headers=self.headers, timeout=30)
-        response.raise_for_status()
-        return response.json()
+        timeout = remaining(DATA_API_TIMEOUT_SECONDS)
+        if timeout <= 0:
+            raise DeadlineExceeded(f"No time left for {action} on {self.collection_name}")
+
+        def post():
+            response = requests.post(url, json=full_payload, headers=self.headers, timeout=timeout)
+            response.raise_for_status()
+            return response.json()
+
+        return data_api_breaker.call(post)
 
     def find_one(self, filter: Dict[str, Any], projection: Optional[Dict[str, Any]] = None) -> Optional[Dict[str, Any]]:
         """Find one document"""
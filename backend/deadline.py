@@ -0,0 +1,88 @@
+"""
+Per-request deadline budget
+
+DeadlineMiddleware gives every request REQUEST_DEADLINE_MS (or less, if the caller
+sends a smaller X-Request-Deadline-Ms, but never under MIN_REQUEST_DEADLINE_MS).
+The budget is set with pymongo.timeout,
+so every MongoDB call made while handling the request - in the handler's worker
+thread too, since contextvars are copied there - gets the remaining time as its
+maxTimeMS and socket timeout. HTTP backends read remaining() for their timeout.
+
+A timeout because a caller-shortened budget ran out says nothing about the
+backend, so circuit breakers ignore it (caller_budget_exhausted()); otherwise
+anyone could open a shard's circuit with a tiny X-Request-Deadline-Ms.
+"""
+import os
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Optional, Tuple
+
+import pymongo
+
+REQUEST_DEADLINE_MS = int(os.getenv("REQUEST_DEADLINE_MS", "8000"))
+# Smallest budget a caller may ask for through the header
+MIN_REQUEST_DEADLINE_MS = int(os.getenv("MIN_REQUEST_DEADLINE_MS", "1000"))
+DEADLINE_HEADER = b"x-request-deadline-ms"
+# A call failing with less than this left is blamed on the budget, not the backend
+EXHAUSTED_SLACK = 0.05
+
+# (monotonic deadline, whether the caller shortened the budget)
+_deadline: ContextVar[Optional[Tuple[float, bool]]] = ContextVar("request_deadline", default=None)
+
+
+class DeadlineExceeded(Exception):
+    """The request's time budget ran out before a backend call (answered with 503)"""
+
+
+@contextmanager
+def request_deadline(seconds: float, caller_chosen: bool = False):
+    """
+    Run the block with a deadline `seconds` from now. caller_chosen marks a budget
+    the client shortened, whose timeouts are not held against the backend.
+    """
+    token = _deadline.set((time.monotonic() + seconds, caller_chosen))
+    try:
+        with pymongo.timeout(seconds):
+            yield
+    finally:
+        _deadline.reset(token)
+
+def current() -> Optional[Tuple[float, bool]]:
+    """The current (monotonic deadline, caller_chosen), or None outside a deadline"""
+    return _deadline.get()
+
+def remaining(default: Optional[float] = None) -> Optional[float]:
+    """Seconds left in the current deadline (capped at default), or default if there is none"""
+    deadline = _deadline.get()
+    if deadline is None:
+        return default
+    left = deadline[0] - time.monotonic()
+    return left if default is None else min(left, default)
+
+def caller_budget_exhausted() -> bool:
+    """True if the caller shortened the budget and it has (all but) run out"""
+    deadline = _deadline.get()
+    return deadline is not None and deadline[1] and deadline[0] - time.monotonic() <= EXHAUSTED_SLACK
+
+
+class DeadlineMiddleware:
+    def __init__(self, app, budget_ms: int = REQUEST_DEADLINE_MS):
+        self.app = app
+        self.budget_ms = budget_ms
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        budget_ms = self.budget_ms
+        for name, value in scope.get("headers", []):
+            if name == DEADLINE_HEADER:
+                try:
+                    budget_ms = min(budget_ms, max(int(value), MIN_REQUEST_DEADLINE_MS))
+                except ValueError:
+                    pass
+                break
+
+        with request_deadline(budget_ms / 1000, caller_chosen=budget_ms < self.budget_ms):
+            await self.app(scope, receive, send)
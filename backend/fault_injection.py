@@ -0,0 +1,88 @@
+"""
+Fault-injecting stand-in for a MongoDB database
+
+FaultyDatabase wraps a Database (real or in-memory) and delays or fails calls on
+its collections, so timeouts, the circuit breaker and stale serving can be
+exercised offline. Injected latency respects the request deadline: a call that
+would overrun it sleeps for what is left and then raises ExecutionTimeout, like
+a server hitting maxTimeMS.
+
+Enable for the whole app with FAULT_INJECTION_LATENCY_MS and/or
+FAULT_INJECTION_ERROR_RATE (0..1). FAULT_INJECTION_JITTER_MS adds uniform jitter.
+"""
+import os
+import random
+import time
+from typing import Optional
+
+from pymongo.errors import AutoReconnect, ExecutionTimeout
+
+try:
+    # Try relative imports (for deployment)
+    from .deadline import remaining
+except ImportError:
+    # Fall back to absolute imports (for local development)
+    from deadline import remaining
+
+LATENCY_MS = float(os.getenv("FAULT_INJECTION_LATENCY_MS", "0"))
+JITTER_MS = float(os.getenv("FAULT_INJECTION_JITTER_MS", "0"))
+ERROR_RATE = float(os.getenv("FAULT_INJECTION_ERROR_RATE", "0"))
+
+
+class FaultInjector:
+    def __init__(self, latency_ms: float = 0, jitter_ms: float = 0, error_rate: float = 0, seed: Optional[int] = None):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self._random = random.Random(seed)
+
+    @property
+    def enabled(self) -> bool:
+        return self.latency_ms > 0 or self.jitter_ms > 0 or self.error_rate > 0
+
+    def before_call(self, name: str):
+        """Sleep and/or raise as configured before a database call"""
+        delay = (self.latency_ms + self._random.uniform(0, self.jitter_ms)) / 1000
+        left = remaining()
+        if left is not None and delay >= left:
+            time.sleep(max(left, 0))
+            raise ExecutionTimeout(f"Injected latency exceeded the deadline in {name}")
+        if delay:
+            time.sleep(delay)
+        if self._random.random() < self.error_rate:
+            raise AutoReconnect(f"Injected failure in {name}")
+
+
+class FaultyCollection:
+    def __init__(self, collection, injector: FaultInjector):
+        self._collection = collection
+        self._injector = injector
+
+    def __getattr__(self, name):
+        attr = getattr(self._collection, name)
+        if not callable(attr):
+            return attr
+
+        def faulty(*args, **kwargs):
+            self._injector.before_call(f"{self._collection.name}.{name}")
+            return attr(*args, **kwargs)
+        return faulty
+
+
+class FaultyDatabase:
+    def __init__(self, db, injector: FaultInjector):
+        self._db = db
+        self._injector = injector
+
+    def __getitem__(self, name):
+        return FaultyCollection(self._db[name], self._injector)
+
+    def __getattr__(self, name):
+        return getattr(self._db, name)
+
+    def command(self, *args, **kwargs):
+        self._injector.before_call("command")
+        return self._db.command(*args, **kwargs)
+
+
+injector = FaultInjector(LATENCY_MS, JITTER_MS, ERROR_RATE)
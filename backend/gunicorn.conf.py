@@ -0,0 +1,31 @@
+"""
+Production server: gunicorn managing uvicorn workers
+
+The app is imported once in the parent (preload_app) and forked into WEB_CONCURRENCY
+workers, so argon2 hashing and requests spread over every core. Each worker opens
+its own MongoClients after fork. On SIGTERM each worker reports draining on /readyz
+for SHUTDOWN_DELAY_SECONDS, then closes its listener, finishes open connections and
+waits for background tasks in the FastAPI lifespan, all within graceful_timeout.
+
+Run with:  gunicorn -c gunicorn.conf.py main:app
+"""
+import multiprocessing
+import os
+
+bind = f"0.0.0.0:{os.getenv('PORT', '8000')}"
+workers = int(os.getenv("WEB_CONCURRENCY", multiprocessing.cpu_count()))
+worker_class = "uvicorn_worker.UvicornWorker"
+preload_app = True
+
+# Must exceed SHUTDOWN_DELAY_SECONDS + DRAIN_TIMEOUT_SECONDS so the drain can finish
+graceful_timeout = int(os.getenv("GRACEFUL_TIMEOUT", "30"))
+timeout = int(os.getenv("WORKER_TIMEOUT", "60"))
+keepalive = 5
+
+accesslog = "-"
+
+
+def post_fork(server, worker):
+    """MongoClient is not fork-safe: give every worker its own clients"""
+    from database import reconnect
+    reconnect()
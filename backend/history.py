@@ -0,0 +1,98 @@
+import os
+from datetime import date, datetime, timedelta, timezone
+
+# Longest range count_completions answers (about 120 month rollups plus edges)
+MAX_RANGE_DAYS = int(os.getenv("HABIT_HISTORY_MAX_DAYS", "3660"))
+
+
+def week_key(day: date) -> str:
+    """ISO week rollup key, e.g. 2026-W42"""
+    year, week, _ = day.isocalendar()
+    return f"{year}-W{week:02d}"
+
+def month_key(day: date) -> str:
+    """Calendar month rollup key, e.g. 2026-10"""
+    return f"{day.year}-{day.month:02d}"
+
+def _next_month_start(day: date) -> date:
+    if day.month == 12:
+        return date(day.year + 1, 1, 1)
+    return date(day.year, day.month + 1, 1)
+
+def _month_end(day: date) -> date:
+    return _next_month_start(day) - timedelta(days=1)
+
+def record_completion(shard, user_id: str, habit_id: str, day: date, session=None) -> bool:
+    """
+    Record that a habit was completed on a day and bump its weekly and monthly rollups.
+
+    The event is upserted on (habit_id, date), so a repeated call for the same day
+    does not count twice. Returns True if a new completion was recorded.
+    """
+    result = shard.habit_events.update_one(
+        {"habit_id": habit_id, "date": str(day)},
+        {"$setOnInsert": {"user_id": user_id, "created_at": datetime.now(timezone.utc)}},
+        upsert=True,
+        session=session
+    )
+    if result.upserted_id is None:
+        return False
+
+    for period, key in (("week", week_key(day)), ("month", month_key(day))):
+        shard.habit_rollups.update_one(
+            {"habit_id": habit_id, "key": key},
+            {"$inc": {"count": 1}, "$setOnInsert": {"user_id": user_id, "period": period}},
+            upsert=True,
+            session=session
+        )
+    return True
+
+def split_range(start: date, end: date):
+    """
+    Split the inclusive range [start, end] into whole months, whole ISO weeks and
+    the leftover edge days. Weeks are only used where they don't swallow the start
+    of a month that fits in the range, so at most a few weeks of edge days remain.
+    """
+    months, weeks, days = [], [], []
+    day = start
+    while day <= end:
+        next_month = _next_month_start(day)
+        if day.day == 1 and _month_end(day) <= end:
+            months.append(month_key(day))
+            day = next_month
+            continue
+
+        week_end = day + timedelta(days=6)
+        if day.weekday() == 0 and week_end <= end and (week_end < next_month or _month_end(next_month) > end):
+            weeks.append(week_key(day))
+            day = week_end + timedelta(days=1)
+            continue
+
+        days.append(str(day))
+        day += timedelta(days=1)
+
+    return months, weeks, days
+
+def count_completions(shard, habit_id: str, start: date, end: date, session=None) -> int:
+    """Count completions of a habit in [start, end] from rollups plus the edge days"""
+    months, weeks, days = split_range(start, end)
+    total = 0
+
+    keys = months + weeks
+    if keys:
+        rollups = shard.habit_rollups.find(
+            {"habit_id": habit_id, "key": {"$in": keys}},
+            {"count": 1},
+            session=session
+        )
+        total += sum(r.get("count", 0) for r in rollups)
+
+    if days:
+        total += shard.habit_events.count_documents({"habit_id": habit_id, "date": {"$in": days}}, session=session)
+
+    return total
+
+def delete_history(shard, habit_id: str, session=None):
+    """Remove all completion events and rollups for a habit"""
+    shard.habit_events.delete_many({"habit_id": habit_id}, session=session)
+    shard.habit_rollups.delete_many({"habit_id": habit_id}, session=session)
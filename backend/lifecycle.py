@@ -0,0 +1,72 @@
+"""
+Readiness and graceful drain
+
+The server (uvicorn, alone or under gunicorn) stops accepting connections on
+SIGTERM and waits for open ones before it runs the lifespan shutdown, so by then
+there are no requests left to wait for. What the app adds:
+
+- install_signal_handler() wraps the server's SIGTERM handler. The process is
+  marked as draining the moment the signal arrives, so /readyz fails, and the
+  server is told SHUTDOWN_DELAY_SECONDS later, giving the load balancer time to
+  stop sending traffic while requests are still being served.
+- track() runs work that outlives its request (e.g. sending an email), and the
+  lifespan shutdown waits for it with drain() before the Mongo clients are closed.
+"""
+import asyncio
+import os
+import signal
+import threading
+from typing import Coroutine, Set
+
+# How long /readyz reports draining before the server starts shutting down
+SHUTDOWN_DELAY_SECONDS = float(os.getenv("SHUTDOWN_DELAY_SECONDS", "5"))
+
+
+class Lifecycle:
+    def __init__(self):
+        self.draining = False
+        self._tasks: Set[asyncio.Task] = set()
+
+    def install_signal_handler(self, delay: float = SHUTDOWN_DELAY_SECONDS):
+        """Mark draining on SIGTERM and pass the signal on to the server after delay"""
+        # Signal handlers can only be set from the main thread (the server's)
+        if threading.current_thread() is not threading.main_thread():
+            return
+        loop = asyncio.get_running_loop()
+        previous = signal.getsignal(signal.SIGTERM)
+
+        def forward(signum, frame):
+            if callable(previous):
+                previous(signum, frame)
+            else:
+                signal.signal(signum, signal.SIG_DFL)
+                signal.raise_signal(signum)
+
+        def on_sigterm(signum, frame):
+            if self.draining:
+                return
+            self.draining = True
+            print(f"SIGTERM received, draining for {delay}s before shutdown")
+            loop.call_soon_threadsafe(loop.call_later, delay, forward, signum, frame)
+
+        signal.signal(signal.SIGTERM, on_sigterm)
+
+    def track(self, coro: Coroutine) -> asyncio.Task:
+        """Run a coroutine in the background and wait for it when draining"""
+        task = asyncio.get_running_loop().create_task(coro)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return task
+
+    async def drain(self, timeout: float) -> bool:
+        """Stop being ready and wait for tracked tasks. Returns False on timeout."""
+        self.draining = True
+        if not self._tasks:
+            return True
+        _, pending = await asyncio.wait(set(self._tasks), timeout=timeout)
+        for task in pending:
+            task.cancel()
+        return not pending
+
+
+lifecycle = Lifecycle()
@@ -1,16 +1,28 @@
-from fastapi import FastAPI
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+from pymongo.errors import ConnectionFailure, ExecutionTimeout
 from mangum import Mangum
 from fastapi.middleware.cors import CORSMiddleware
 from contextlib import asynccontextmanager
+import os
 
 try:
     # Try relative imports (for Railway/Vercel deployment)
     from .routes import habits, auth
-    from .database import ensure_indexes
+    from .database import ensure_indexes, ensure_directory, close_clients, ping
+    from .lifecycle import lifecycle
+    from .deadline import DeadlineMiddleware, DeadlineExceeded
+    from .circuit_breaker import BackendUnavailable
 except ImportError:
     # Fall back to absolute imports (for local development)
     from routes import habits, auth
-    from database import ensure_indexes
+    from database import ensure_indexes, ensure_directory, close_clients, ping
+    from lifecycle import lifecycle
+    from deadline import DeadlineMiddleware, DeadlineExceeded
+    from circuit_breaker import BackendUnavailable
+
+# How long shutdown waits for background tasks (after the server has closed its connections)
+DRAIN_TIMEOUT = float(os.getenv("DRAIN_TIMEOUT_SECONDS", "20"))
 
 
 @asynccontextmanager
@@ -18,8 +30,13 @@ async def lifespan(app: FastAPI):
     """Application lifespan events"""
     # Startup
     ensure_indexes()
+    ensure_directory()
+    lifecycle.install_signal_handler()
     yield
-    # Shutdown (if needed in future)
+    # Shutdown: finish outstanding work before the Mongo clients go away
+    if not await lifecycle.drain(DRAIN_TIMEOUT):
+        print(f"Shutdown drain timed out after {DRAIN_TIMEOUT}s")
+    close_clients()
 
 
 app = FastAPI(title="Smart Habit Garden API", version="1.0.0", lifespan=lifespan)
@@ -40,6 +57,20 @@ app.add_middleware(
     allow_origin_regex=r"https://.*\.netlify\.app",
 )
 
+app.add_middleware(DeadlineMiddleware)
+
+@app.exception_handler(BackendUnavailable)
+@app.exception_handler(DeadlineExceeded)
+@app.exception_handler(ConnectionFailure)
+@app.exception_handler(ExecutionTimeout)
+async def backend_unavailable(request: Request, exc: Exception):
+    """Fail fast with 503 when the database is down, slow or its circuit is open"""
+    return JSONResponse(
+        status_code=503,
+        content={"detail": "Service temporarily unavailable, please retry"},
+        headers={"Retry-After": "5"},
+    )
+
 app.include_router(auth.router)
 app.include_router(habits.router)
 
@@ -47,6 +78,20 @@ app.include_router(habits.router)
 def root():
     return {"message": "Welcome to Smart Habit Garden API!"}
 
+@app.get("/healthz")
+def liveness():
+    """Liveness: the process is up and serving"""
+    return {"status": "ok"}
+
+@app.get("/readyz")
+def readiness():
+    """Readiness: not draining and MongoDB is reachable"""
+    if lifecycle.draining:
+        return JSONResponse(status_code=503, content={"status": "draining"})
+    if not ping():
+        return JSONResponse(status_code=503, content={"status": "database unavailable"})
+    return {"status": "ready"}
+
 # Mangum handler for AWS Lambda
 handler = Mangum(app, lifespan="off")
 
@@ -0,0 +1,144 @@
+"""
+Online rebalancing of users between shards
+
+A move first marks the user's directory entry with moving_to, which makes every
+write path answer 503 for that user, and waits MOVE_GRACE_SECONDS (longer than a
+request may run) so writes that looked up the shard before the mark have landed.
+The source is then frozen: its documents are copied to the target, the entry is
+flipped to the target with the mark cleared in one update (recording moved_from),
+and the source copies are deleted. Reads keep going to the source until the flip.
+
+Every step is idempotent and the entry records how far a move got, so a move that
+died half way is finished by running it again.
+
+Usage:
+    python rebalance.py                    # move every user the ring places elsewhere
+    python rebalance.py --dry-run
+    python rebalance.py --user <id> --to <shard>
+"""
+import argparse
+import os
+import time
+from typing import Dict
+
+from bson import ObjectId
+from pymongo import ReplaceOne
+
+try:
+    # Try relative imports (for deployment)
+    from .sharding import USER_COLLECTIONS, Shard, ShardRouter
+    from .deadline import REQUEST_DEADLINE_MS
+except ImportError:
+    # Fall back to absolute imports (for local development)
+    from sharding import USER_COLLECTIONS, Shard, ShardRouter
+    from deadline import REQUEST_DEADLINE_MS
+
+BATCH_SIZE = 500
+# A request that resolved the user's shard before the moving mark finishes within its deadline
+MOVE_GRACE_SECONDS = float(os.getenv("MOVE_GRACE_SECONDS", str(REQUEST_DEADLINE_MS / 1000 + 2)))
+
+
+def _user_filter(collection: str, user_id: str) -> Dict:
+    if collection == "users":
+        return {"_id": ObjectId(user_id)}
+    return {"user_id": user_id}
+
+def _copy_user(source: Shard, target: Shard, user_id: str) -> int:
+    """Copy a user's documents from source to target. Returns documents written."""
+    written = 0
+    for name in USER_COLLECTIONS:
+        batch = []
+        for doc in source.db[name].find(_user_filter(name, user_id)):
+            batch.append(ReplaceOne({"_id": doc["_id"]}, doc, upsert=True))
+            if len(batch) >= BATCH_SIZE:
+                target.db[name].bulk_write(batch, ordered=False)
+                written += len(batch)
+                batch = []
+        if batch:
+            target.db[name].bulk_write(batch, ordered=False)
+            written += len(batch)
+    return written
+
+def _delete_user(shard: Shard, user_id: str):
+    for name in USER_COLLECTIONS:
+        shard.db[name].delete_many(_user_filter(name, user_id))
+
+def move_user(router: ShardRouter, user_id: str, target_name: str, grace: float = MOVE_GRACE_SECONDS) -> bool:
+    """Move one user's data to another shard. Returns False if it is already there."""
+    directory = router.home.user_directory
+    target = router.shards[target_name]
+    entry = directory.find_one({"_id": user_id})
+    if entry is None:
+        # Created before sharding was enabled
+        user = router.home.users.find_one({"_id": ObjectId(user_id)}, {"email": 1})
+        if not user:
+            raise ValueError(f"User {user_id} not found on shard {router.home.name}")
+        entry = {"_id": user_id, "email": user["email"], "shard": router.home.name}
+        directory.update_one({"_id": user_id}, {"$setOnInsert": entry}, upsert=True)
+
+    if "moved_from" in entry:
+        # An earlier move flipped the entry but died before cleaning up its source
+        _delete_user(router.shards[entry["moved_from"]], user_id)
+        directory.update_one({"_id": user_id}, {"$unset": {"moved_from": ""}})
+
+    source = router.shards[entry["shard"]]
+    unfinished = router.shards[entry["moving_to"]] if "moving_to" in entry else None
+    if unfinished is not None and unfinished is not target and unfinished is not source:
+        # Partial copies of an interrupted move to another shard were never used
+        _delete_user(unfinished, user_id)
+    if source is target:
+        if unfinished is not None:
+            directory.update_one({"_id": user_id}, {"$unset": {"moving_to": "", "moving_since": ""}})
+        return False
+
+    # Freeze the source: write paths refuse the user from now on
+    since = entry.get("moving_since", time.time())
+    directory.update_one({"_id": user_id}, {"$set": {"moving_to": target.name, "moving_since": since}})
+    time.sleep(max(0.0, since + grace - time.time()))
+
+    _copy_user(source, target, user_id)
+    directory.update_one(
+        {"_id": user_id},
+        {"$set": {"shard": target.name, "moved_from": source.name}, "$unset": {"moving_to": "", "moving_since": ""}}
+    )
+    _delete_user(source, user_id)
+    directory.update_one({"_id": user_id}, {"$unset": {"moved_from": ""}})
+    return True
+
+def rebalance(router: ShardRouter, dry_run: bool = False) -> int:
+    """Move every user whose shard differs from the ring placement. Returns users moved."""
+    if not router.sharded:
+        return 0
+    if not dry_run:
+        router.backfill_directory()
+
+    moved = 0
+    for entry in list(router.home.user_directory.find({})):
+        target = router.ring_shard(entry["_id"])
+        if entry["shard"] == target.name and "moving_to" not in entry and "moved_from" not in entry:
+            continue
+        print(f"{entry['_id']}: {entry['shard']} -> {target.name}")
+        if dry_run or move_user(router, entry["_id"], target.name):
+            moved += 1
+    return moved
+
+
+if __name__ == "__main__":
+    try:
+        from .database import shard_router
+    except ImportError:
+        from database import shard_router
+
+    parser = argparse.ArgumentParser(description="Move users between shards")
+    parser.add_argument("--dry-run", action="store_true", help="only print the moves")
+    parser.add_argument("--user", help="move a single user id")
+    parser.add_argument("--to", help="target shard for --user")
+    args = parser.parse_args()
+
+    if args.user:
+        if not args.to:
+            parser.error("--user requires --to")
+        moved = move_user(shard_router, args.user, args.to)
+        print(f"Moved {args.user} to {args.to}" if moved else f"{args.user} is already on {args.to}")
+    else:
+        print(f"{'Would move' if args.dry_run else 'Moved'} {rebalance(shard_router, args.dry_run)} users")
@@ -1,12 +1,16 @@
 from fastapi import APIRouter, HTTPException, status, Depends
+from bson import ObjectId
+from pymongo.errors import DuplicateKeyError
+from starlette.concurrency import run_in_threadpool
 from datetime import datetime, timedelta, timezone
 import secrets
 
 try:
     # Try relative imports (for deployment)
     from ..models import UserCreate, UserLogin, UserResponse, Token, ForgotPasswordRequest, ResetPasswordRequest
-    from ..database import users_collection, reset_tokens_collection
+    from ..database import shard_router
     from ..auth import (
+        get_user_by_email,
         get_password_hash,
         verify_password,
         create_access_token,
@@ -14,11 +18,13 @@ try:
         ACCESS_TOKEN_EXPIRE_MINUTES
     )
     from ..email_service import send_password_reset_email
+    from ..lifecycle import lifecycle
 except ImportError:
     # Fall back to absolute imports (for local development)
     from models import UserCreate, UserLogin, UserResponse, Token, ForgotPasswordRequest, ResetPasswordRequest
-    from database import users_collection, reset_tokens_collection
+    from database import shard_router
     from auth import (
+        get_user_by_email,
         get_password_hash,
         verify_password,
         create_access_token,
@@ -26,20 +32,22 @@ except ImportError:
         ACCESS_TOKEN_EXPIRE_MINUTES
     )
     from email_service import send_password_reset_email
+    from lifecycle import lifecycle
 
 router = APIRouter(prefix="/auth", tags=["authentication"])
 
 @router.post("/signup", response_model=UserResponse, status_code=status.HTTP_201_CREATED)
 async def signup(user: UserCreate):
     """Register a new user"""
-    existing_user = users_collection.find_one({"email": user.email})
-    if existing_user:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Email already registered"
-        )
+    email_taken = HTTPException(
+        status_code=status.HTTP_400_BAD_REQUEST,
+        detail="Email already registered"
+    )
 
+    # The id is chosen up front because it decides which shard the user lives on
+    user_id = ObjectId()
     user_dict = {
+        "_id": user_id,
         "email": user.email,
         "full_name": user.full_name,
         "hashed_password": get_password_hash(user.password),
@@ -47,20 +55,35 @@ async def signup(user: UserCreate):
         "created_at": datetime.now(timezone.utc)
     }
 
-    result = users_collection.insert_one(user_dict)
-    created_user = users_collection.find_one({"_id": result.inserted_id})
+    # Duplicate emails are caught by the unique email indexes (directory and users);
+    # register_user reclaims an entry left behind by a signup that died half way.
+    # Until the directory is backfilled, pre-sharding users are only known to the home shard.
+    if not shard_router.directory_complete() and shard_router.home.users.find_one({"email": user.email}, {"_id": 1}):
+        raise email_taken
+    try:
+        shard = shard_router.register_user(str(user_id), user.email)
+    except DuplicateKeyError:
+        raise email_taken
+    try:
+        shard.users.insert_one(user_dict)
+    except DuplicateKeyError:
+        shard_router.unregister_user(str(user_id))
+        raise email_taken
+    except Exception:
+        shard_router.unregister_user(str(user_id))
+        raise
 
     return UserResponse(
-        id=str(created_user["_id"]),
-        email=created_user["email"],
-        full_name=created_user["full_name"],
-        is_active=created_user["is_active"]
+        id=str(user_id),
+        email=user_dict["email"],
+        full_name=user_dict["full_name"],
+        is_active=user_dict["is_active"]
     )
 
 @router.post("/login", response_model=Token)
 async def login(user_credentials: UserLogin):
     """Login user and return JWT token"""
-    user = users_collection.find_one({"email": user_credentials.email})
+    user = await run_in_threadpool(get_user_by_email, user_credentials.email)
 
     if not user:
         raise HTTPException(
@@ -97,7 +120,7 @@ async def get_current_user_info(current_user: UserResponse = Depends(get_current
 @router.post("/forgot-password")
 async def forgot_password(request: ForgotPasswordRequest):
     """Send password reset email"""
-    user = users_collection.find_one({"email": request.email})
+    user = await run_in_threadpool(get_user_by_email, request.email)
 
     if not user:
         return {"message": "If the email exists, a password reset link has been sent"}
@@ -111,18 +134,19 @@ async def forgot_password(request: ForgotPasswordRequest):
         "used": False
     }
 
-    reset_tokens_collection.delete_many({"email": request.email, "used": False})
+    shard_router.home.reset_tokens.delete_many({"email": request.email, "used": False})
 
-    reset_tokens_collection.insert_one(reset_token_dict)
+    shard_router.home.reset_tokens.insert_one(reset_token_dict)
 
-    send_password_reset_email(request.email, reset_token)
+    # Sent in the background; shutdown waits for it (see lifecycle.py)
+    lifecycle.track(run_in_threadpool(send_password_reset_email, request.email, reset_token))
 
     return {"message": "If the email exists, a password reset link has been sent"}
 
 @router.post("/reset-password")
 async def reset_password(request: ResetPasswordRequest):
     """Reset password using token"""
-    token_doc = reset_tokens_collection.find_one({
+    token_doc = shard_router.home.reset_tokens.find_one({
         "token": request.token,
         "used": False
     })
@@ -144,7 +168,15 @@ async def reset_password(request: ResetPasswordRequest):
     email = token_doc["email"]
     hashed_password = get_password_hash(request.new_password)
 
-    result = users_collection.update_one(
+    entry = shard_router.locate_emails([email]).get(email)
+    if entry and "moving_to" in entry:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Account is being moved, please retry shortly",
+            headers={"Retry-After": "5"}
+        )
+
+    result = shard_router.shard_for_entry(entry).users.update_one(
         {"email": email},
         {"$set": {"hashed_password": hashed_password}}
     )
@@ -155,7 +187,7 @@ async def reset_password(request: ResetPasswordRequest):
             detail="User not found"
         )
 
-    reset_tokens_collection.update_one(
+    shard_router.home.reset_tokens.update_one(
         {"token": request.token},
         {"$set": {"used": True}}
     )
@@ -1,73 +1,130 @@
 from fastapi import APIRouter, HTTPException, Depends
 from bson import ObjectId
-from datetime import datetime, timedelta, timezone
+from datetime import date, datetime, timedelta, timezone
+from typing import Optional
+from pymongo import ReturnDocument
 
 try:
     # Try relative imports (for deployment)
     from ..models import Habit, UserResponse
-    from ..database import habits_collection, days_log_collection
+    from ..sharding import Shard
     from ..utils import to_str_id
-    from ..auth import get_current_active_user
+    from ..auth import get_current_active_user, get_current_user_shard, get_writable_user_shard
+    from ..history import MAX_RANGE_DAYS, record_completion, count_completions, delete_history
+    from ..compaction import compacted_totals
+    from ..sessions import in_transaction, read_session, write_session
+    from ..database import shard_router
+    from ..batching import Batcher
+    from ..circuit_breaker import stale_cache
 except ImportError:
     # Fall back to absolute imports (for local development)
     from models import Habit, UserResponse
-    from database import habits_collection, days_log_collection
+    from sharding import Shard
     from utils import to_str_id
-    from auth import get_current_active_user
+    from auth import get_current_active_user, get_current_user_shard, get_writable_user_shard
+    from history import MAX_RANGE_DAYS, record_completion, count_completions, delete_history
+    from compaction import compacted_totals
+    from sessions import in_transaction, read_session, write_session
+    from database import shard_router
+    from batching import Batcher
+    from circuit_breaker import stale_cache
 
 router = APIRouter(prefix="/habits", tags=["habits"])
 
+def _load_habits(keys):
+    """Load habits by (shard name, habit id) with one $in query per shard"""
+    ids_by_shard = {}
+    for shard_name, habit_id in keys:
+        ids_by_shard.setdefault(shard_name, []).append(ObjectId(habit_id))
+    habits = {}
+    for shard_name, ids in ids_by_shard.items():
+        for h in shard_router.shards[shard_name].habits.find({"_id": {"$in": ids}}):
+            habits[(shard_name, str(h["_id"]))] = h
+    return habits
+
+# Concurrent lookups of single habits share round-trips
+habit_loader = Batcher(_load_habits)
+
+def _get_user_habit(shard: Shard, habit_id: str, user_id: str):
+    """The user's habit with this id, or None"""
+    habit = habit_loader.load((shard.name, habit_id))
+    if habit is None or habit.get("user_id") != user_id:
+        return None
+    return habit
+
 @router.get("/")
-def get_habits(current_user: UserResponse = Depends(get_current_active_user)):
-    habits = [to_str_id(h) for h in habits_collection.find({"user_id": current_user.id}).sort("_id", -1)]
+def get_habits(current_user: UserResponse = Depends(get_current_active_user), shard: Shard = Depends(get_current_user_shard)):
+    with read_session(shard, current_user.id) as session:
+        habits = [to_str_id(h) for h in shard.reader.habits.find({"user_id": current_user.id}, session=session).sort("_id", -1)]
     return habits
 
 @router.post("/")
-def add_habit(habit: Habit, current_user: UserResponse = Depends(get_current_active_user)):
+def add_habit(habit: Habit, current_user: UserResponse = Depends(get_current_active_user), shard: Shard = Depends(get_writable_user_shard)):
     # Do not persist 'id' field; let Mongo create _id
     hdict = habit.model_dump()
     hdict.pop("id", None)
     hdict["user_id"] = current_user.id
-    result = habits_collection.insert_one(hdict)
-    created = habits_collection.find_one({"_id": result.inserted_id})
-    return to_str_id(created)
+    with write_session(shard, current_user.id) as session:
+        result = shard.habits.insert_one(hdict, session=session)
+    # The response is the document we wrote; no need to read it back
+    hdict["_id"] = result.inserted_id
+    return to_str_id(hdict)
 
 @router.put("/{habit_id}")
-def update_habit(habit_id: str, habit: Habit, current_user: UserResponse = Depends(get_current_active_user)):
+def update_habit(habit_id: str, habit: Habit, current_user: UserResponse = Depends(get_current_active_user), shard: Shard = Depends(get_writable_user_shard)):
     if not ObjectId.is_valid(habit_id):
         raise HTTPException(status_code=400, detail="Invalid habit id")
     payload = habit.model_dump()
     payload.pop("id", None)
-    res = habits_collection.update_one({"_id": ObjectId(habit_id), "user_id": current_user.id}, {"$set": payload})
-    if res.matched_count == 0:
+    with write_session(shard, current_user.id) as session:
+        updated = shard.habits.find_one_and_update(
+            {"_id": ObjectId(habit_id), "user_id": current_user.id},
+            {"$set": payload},
+            return_document=ReturnDocument.AFTER,
+            session=session
+        )
+    if updated is None:
         raise HTTPException(status_code=404, detail="Habit not found")
-    updated = habits_collection.find_one({"_id": ObjectId(habit_id)})
     return to_str_id(updated)
 
 @router.delete("/{habit_id}")
-def delete_habit(habit_id: str, current_user: UserResponse = Depends(get_current_active_user)):
+def delete_habit(habit_id: str, current_user: UserResponse = Depends(get_current_active_user), shard: Shard = Depends(get_writable_user_shard)):
     if not ObjectId.is_valid(habit_id):
         raise HTTPException(status_code=400, detail="Invalid habit id")
-    res = habits_collection.delete_one({"_id": ObjectId(habit_id), "user_id": current_user.id})
-    if res.deleted_count == 0:
-        raise HTTPException(status_code=404, detail="Habit not found")
+    with write_session(shard, current_user.id) as session:
+        res = shard.habits.delete_one({"_id": ObjectId(habit_id), "user_id": current_user.id}, session=session)
+        if res.deleted_count == 0:
+            raise HTTPException(status_code=404, detail="Habit not found")
+        delete_history(shard, habit_id, session=session)
     return {"message": "Habit deleted", "id": habit_id}
 
 
 @router.get("/calendar")
-def get_calendar_data(current_user: UserResponse = Depends(get_current_active_user)):
+def get_calendar_data(current_user: UserResponse = Depends(get_current_active_user), shard: Shard = Depends(get_current_user_shard)):
     """Get heatmap calendar data for the last 365 days"""
-    # Get all days_log entries for this user
-    days_logs = list(days_log_collection.find({"user_id": current_user.id}))
+    today = datetime.now(timezone.utc).date()
+    first_day = str(today - timedelta(days=364))
 
-    # Create a dictionary of dates with counts
-    calendar_data = {}
-    for log in days_logs:
-        date_str = log["date"]
-        calendar_data[date_str] = calendar_data.get(date_str, 0) + 1
+    def load():
+        # Only the days_log entries inside the window; older rows may be compacted away
+        with read_session(shard, current_user.id) as session:
+            days_logs = shard.reader.days_log.find(
+                {"user_id": current_user.id, "date": {"$gte": first_day}},
+                {"date": 1, "_id": 0},
+                session=session
+            )
+
+            # Create a dictionary of dates with counts
+            calendar_data = {}
+            for log in days_logs:
+                date_str = log["date"]
+                calendar_data[date_str] = calendar_data.get(date_str, 0) + 1
+        return calendar_data
+
+    # While the database is unavailable this can answer with the last good data
+    calendar_data = stale_cache.serve(("calendar", current_user.id), load)
 
     # Generate last 365 days
-    today = datetime.now(timezone.utc).date()
     calendar = []
     for i in range(365):
         date = today - timedelta(days=i)
@@ -82,9 +139,17 @@ def get_calendar_data(current_user: UserResponse = Depends(get_current_active_us
 
 
 @router.get("/insights")
-def habit_insights(current_user: UserResponse = Depends(get_current_active_user)):
-    habits = list(habits_collection.find({"user_id": current_user.id}))
-    total_logged_days = days_log_collection.count_documents({"user_id": current_user.id})
+def habit_insights(current_user: UserResponse = Depends(get_current_active_user), shard: Shard = Depends(get_current_user_shard)):
+    def load():
+        with read_session(shard, current_user.id) as session:
+            habits = list(shard.reader.habits.find({"user_id": current_user.id}, session=session))
+            # Raw rows only cover the retention window; older years are folded into summaries
+            total_logged_days = shard.reader.days_log.count_documents({"user_id": current_user.id}, session=session)
+            total_logged_days += compacted_totals(shard.reader, current_user.id, session=session)["count"]
+        return habits, total_logged_days
+
+    # While the database is unavailable this can answer with the last good data
+    habits, total_logged_days = stale_cache.serve(("insights", current_user.id), load)
 
     if total_logged_days == 0:
         total_logged_days = 1
@@ -125,8 +190,10 @@ def habit_insights(current_user: UserResponse = Depends(get_current_active_user)
 
 
 @router.put("/{habit_id}/grow")
-def grow_habit(habit_id: str, current_user: UserResponse = Depends(get_current_active_user)):
-    habit = habits_collection.find_one({"_id": ObjectId(habit_id), "user_id": current_user.id})
+def grow_habit(habit_id: str, current_user: UserResponse = Depends(get_current_active_user), shard: Shard = Depends(get_writable_user_shard)):
+    if not ObjectId.is_valid(habit_id):
+        raise HTTPException(status_code=400, detail="Invalid habit id")
+    habit = _get_user_habit(shard, habit_id, current_user.id)
     if not habit:
         raise HTTPException(status_code=404, detail="Habit not found")
 
@@ -155,13 +222,62 @@ def grow_habit(habit_id: str, current_user: UserResponse = Depends(get_current_a
         "last_updated": datetime.now(timezone.utc),
     }
 
-    habits_collection.update_one({"_id": ObjectId(habit_id)}, {"$set": updated})
+    def grow(session):
+        # History first: if anything fails before the streak update, a retry is not
+        # refused with "Already grown today", and the event upsert never counts twice
+        record_completion(shard, current_user.id, habit_id, today, session=session)
 
+        # One days_log row per user per day, created on the first grow of the day
+        shard.days_log.update_one(
+            {"date": str(today), "user_id": current_user.id},
+            {"$setOnInsert": {"created_at": datetime.now(timezone.utc)}},
+            upsert=True,
+            session=session
+        )
 
-    today_str = str(today)
-    existing_day = days_log_collection.find_one({"date": today_str, "user_id": current_user.id})
-    if not existing_day:
-        days_log_collection.insert_one({"date": today_str, "user_id": current_user.id, "created_at": datetime.now(timezone.utc)})
+        return shard.habits.find_one_and_update(
+            {"_id": ObjectId(habit_id)},
+            {"$set": updated},
+            return_document=ReturnDocument.AFTER,
+            session=session
+        )
 
-    new_doc = habits_collection.find_one({"_id": ObjectId(habit_id)})
+    with write_session(shard, current_user.id) as session:
+        new_doc = in_transaction(session, grow)
     return to_str_id(new_doc)
+
+
+@router.get("/{habit_id}/history")
+def habit_history(
+    habit_id: str,
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+    current_user: UserResponse = Depends(get_current_active_user),
+    shard: Shard = Depends(get_current_user_shard)
+):
+    """Count completions of a habit over a date range (defaults to the last 365 days)"""
+    if not ObjectId.is_valid(habit_id):
+        raise HTTPException(status_code=400, detail="Invalid habit id")
+    habit = _get_user_habit(shard, habit_id, current_user.id)
+    if not habit:
+        raise HTTPException(status_code=404, detail="Habit not found")
+
+    today = datetime.now(timezone.utc).date()
+    end = min(end or today, today)
+    start = start or end - timedelta(days=364)
+    if start > end:
+        raise HTTPException(status_code=400, detail="start must not be after end")
+    # Nothing can be recorded before the habit existed
+    start = max(start, ObjectId(habit_id).generation_time.date())
+    if (end - start).days >= MAX_RANGE_DAYS:
+        raise HTTPException(status_code=400, detail=f"Range must be at most {MAX_RANGE_DAYS} days")
+
+    with read_session(shard, current_user.id) as session:
+        completions = count_completions(shard.reader, habit_id, start, end, session=session)
+
+    return {
+        "habit_id": habit_id,
+        "start": str(start),
+        "end": str(end),
+        "completions": completions,
+    }
@@ -0,0 +1,92 @@
+"""
+Read-your-writes for reads routed to secondaries
+
+Analytics reads go to shard.reader, whose read preference may send them to a
+secondary. To keep a user from seeing data older than their own last write, every
+write runs in a causally consistent session and the session's cluster/operation
+time is remembered per user. A later read session for that user is advanced to
+those times, so the secondary waits until it has caught up with the write
+(readConcern afterClusterTime) before answering.
+
+The times are kept per process; a user's reads on another worker fall back to the
+configured max staleness.
+"""
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+
+from pymongo.errors import OperationFailure
+
+MAX_TRACKED_USERS = 10000
+# Returned by a standalone mongod for transactions (they need a replica set or mongos)
+_ILLEGAL_OPERATION = 20
+
+
+class CausalTimes:
+    """Latest (cluster_time, operation_time) seen for each user's writes, LRU-bounded"""
+
+    def __init__(self, max_users: int = MAX_TRACKED_USERS):
+        self.max_users = max_users
+        self._times = OrderedDict()
+        self._lock = threading.Lock()
+
+    def record(self, user_id: str, cluster_time, operation_time):
+        if operation_time is None:
+            return
+        with self._lock:
+            previous = self._times.get(user_id)
+            if previous and previous[1] is not None and previous[1] > operation_time:
+                return
+            self._times[user_id] = (cluster_time, operation_time)
+            self._times.move_to_end(user_id)
+            while len(self._times) > self.max_users:
+                self._times.popitem(last=False)
+
+    def get(self, user_id: str):
+        with self._lock:
+            return self._times.get(user_id)
+
+
+causal_times = CausalTimes()
+
+
+@contextmanager
+def write_session(shard, user_id: str):
+    """Causally consistent session for a user's writes; remembers where they landed"""
+    if shard.client is None:
+        yield None
+        return
+    with shard.client.start_session(causal_consistency=True) as session:
+        try:
+            yield session
+        finally:
+            causal_times.record(user_id, session.cluster_time, session.operation_time)
+
+@contextmanager
+def read_session(shard, user_id: str):
+    """Causally consistent session for a user's reads, ordered after their last write"""
+    if shard.client is None:
+        yield None
+        return
+    with shard.client.start_session(causal_consistency=True) as session:
+        times = causal_times.get(user_id)
+        if times:
+            cluster_time, operation_time = times
+            if cluster_time is not None:
+                session.advance_cluster_time(cluster_time)
+            session.advance_operation_time(operation_time)
+        yield session
+
+def in_transaction(session, callback):
+    """
+    Run callback(session) as one transaction (retried on transient errors). Without
+    a session, or on a standalone server, it runs as separate writes instead.
+    """
+    if session is None:
+        return callback(None)
+    try:
+        return session.with_transaction(callback)
+    except OperationFailure as e:
+        if e.code != _ILLEGAL_OPERATION:
+            raise
+    return callback(session)
@@ -0,0 +1,216 @@
+"""
+User-hash sharding across several MongoDB databases
+
+Every user lives on exactly one shard. New users are placed by consistent hashing
+of their id; the user_directory collection on the home shard records the placement
+({_id: user_id, email, shard}) and is the source of truth, so a user can be moved
+by the rebalancer without changing the ring. Users without a directory entry were
+created before sharding was enabled and live on the home shard. While the
+rebalancer moves a user its entry carries moving_to and writes for the user wait.
+
+With a single shard configured the directory is never touched and every lookup
+resolves to the home shard without a round-trip.
+"""
+import bisect
+import hashlib
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional
+
+from pymongo.errors import DuplicateKeyError
+
+try:
+    # Try relative imports (for deployment)
+    from .circuit_breaker import CircuitBreaker, GuardedCollection
+    from .deadline import REQUEST_DEADLINE_MS
+except ImportError:
+    # Fall back to absolute imports (for local development)
+    from circuit_breaker import CircuitBreaker, GuardedCollection
+    from deadline import REQUEST_DEADLINE_MS
+
+# Collections that hold per-user data and move with the user between shards
+USER_COLLECTIONS = ("users", "habits", "days_log", "habit_events", "habit_rollups", "days_log_summaries")
+# Marker in the home shard's migrations collection once every user has a directory entry
+DIRECTORY_BACKFILL = "user_directory_backfill"
+# A signup finishes within its request deadline; an older entry without a user is orphaned
+ORPHAN_GRACE_SECONDS = REQUEST_DEADLINE_MS / 1000 + 60
+
+
+class Shard:
+    """The collections of one shard database"""
+
+    def __init__(self, name: str, db, read_db=None, breaker: Optional[CircuitBreaker] = None):
+        """
+        read_db: the same database with a secondary read preference. shard.reader
+        exposes its collections for read-heavy endpoints; writes always use shard.
+        breaker: circuit breaker guarding every collection call (one per shard by default)
+        """
+        self.name = name
+        self.db = db
+        self.client = getattr(db, "client", None)
+        self.breaker = breaker or CircuitBreaker(f"shard {name}")
+        self.reader = Shard(name, read_db, breaker=self.breaker) if read_db is not None else self
+        self.users = self._collection("users")
+        self.habits = self._collection("habits")
+        self.days_log = self._collection("days_log")
+        self.habit_events = self._collection("habit_events")
+        self.habit_rollups = self._collection("habit_rollups")
+        self.days_log_summaries = self._collection("days_log_summaries")
+        # Only used on the home shard
+        self.reset_tokens = self._collection("reset_tokens")
+        self.user_directory = self._collection("user_directory")
+        self.migrations = self._collection("migrations")
+
+    def _collection(self, name: str) -> GuardedCollection:
+        return GuardedCollection(self.db[name], self.breaker)
+
+    def __repr__(self) -> str:
+        return f"Shard({self.name!r})"
+
+
+class ShardRouter:
+    """Maps users to shards by consistent hashing, with a directory for lookups by email"""
+
+    def __init__(
+        self,
+        databases: Dict[str, object],
+        home: Optional[str] = None,
+        vnodes: int = 64,
+        read_databases: Optional[Dict[str, object]] = None
+    ):
+        """
+        databases: shard name -> pymongo Database (or any stand-in with the same API)
+        home: shard holding the directory and reset tokens (defaults to the first one)
+        vnodes: points per shard on the hash ring
+        read_databases: optional shard name -> Database used for replica reads
+        """
+        self.vnodes = vnodes
+        self._directory_complete = False
+        self.configure(databases, home, read_databases)
+
+    def configure(
+        self,
+        databases: Dict[str, object],
+        home: Optional[str] = None,
+        read_databases: Optional[Dict[str, object]] = None
+    ):
+        """(Re)build the shards and the ring, e.g. with fresh clients after a fork"""
+        if not databases:
+            raise ValueError("At least one shard database is required")
+        read_databases = read_databases or {}
+        self.shards = {name: Shard(name, db, read_databases.get(name)) for name, db in databases.items()}
+        self.home = self.shards[home or next(iter(databases))]
+
+        points = sorted(
+            (self._hash(f"{name}#{i}"), name)
+            for name in self.shards
+            for i in range(self.vnodes)
+        )
+        self._ring: List[int] = [point for point, _ in points]
+        self._ring_names: List[str] = [name for _, name in points]
+
+    @staticmethod
+    def _hash(value: str) -> int:
+        return int.from_bytes(hashlib.md5(value.encode("utf-8")).digest()[:8], "big")
+
+    @property
+    def sharded(self) -> bool:
+        return len(self.shards) > 1
+
+    def ring_shard(self, user_id: str) -> Shard:
+        """Shard the hash ring assigns to a user id"""
+        index = bisect.bisect(self._ring, self._hash(user_id)) % len(self._ring)
+        return self.shards[self._ring_names[index]]
+
+    def shard_for_entry(self, entry: Optional[dict]) -> Shard:
+        """Shard named by a directory entry (users without one live on the home shard)"""
+        return self.shards[entry["shard"]] if entry else self.home
+
+    def locate_emails(self, emails: List[str]) -> Dict[str, dict]:
+        """Directory entries by email, with one query (empty when not sharded)"""
+        if not self.sharded:
+            return {}
+        return {entry["email"]: entry for entry in self.home.user_directory.find({"email": {"$in": list(emails)}})}
+
+    def is_moving(self, user_id: str) -> bool:
+        """True while the rebalancer is moving the user (its writes must wait)"""
+        if not self.sharded:
+            return False
+        return self.home.user_directory.find_one({"_id": user_id, "moving_to": {"$exists": True}}, {"_id": 1}) is not None
+
+    def backfill_directory(self) -> int:
+        """Add directory entries for users created before sharding was enabled. Returns entries added."""
+        added = 0
+        for user in self.home.users.find({}, {"email": 1}):
+            try:
+                result = self.home.user_directory.update_one(
+                    {"_id": str(user["_id"])},
+                    {"$setOnInsert": {"email": user["email"], "shard": self.home.name}},
+                    upsert=True
+                )
+            except DuplicateKeyError:
+                print(f"Directory already has another user with email {user['email']} (user {user['_id']} skipped)")
+                continue
+            if result.upserted_id is not None:
+                added += 1
+        self.home.migrations.update_one(
+            {"_id": DIRECTORY_BACKFILL},
+            {"$set": {"completed_at": datetime.now(timezone.utc)}},
+            upsert=True
+        )
+        self._directory_complete = True
+        return added
+
+    def directory_complete(self) -> bool:
+        """True once every pre-sharding user has a directory entry (remembered per process)"""
+        if not self.sharded:
+            return True
+        if not self._directory_complete:
+            self._directory_complete = self.home.migrations.find_one({"_id": DIRECTORY_BACKFILL}) is not None
+        return self._directory_complete
+
+    def ensure_directory(self):
+        """Backfill the directory the first time the app starts with several shards"""
+        if not self.directory_complete():
+            added = self.backfill_directory()
+            print(f"Backfilled {added} user directory entries")
+
+    def register_user(self, user_id: str, email: str) -> Shard:
+        """Pick the shard for a new user and record it in the directory"""
+        if not self.sharded:
+            return self.home
+        shard = self.ring_shard(user_id)
+        entry = {"_id": user_id, "email": email, "shard": shard.name, "created_at": datetime.now(timezone.utc)}
+        try:
+            self.home.user_directory.insert_one(entry)
+        except DuplicateKeyError:
+            if not self._reclaim_orphan(email):
+                raise
+            self.home.user_directory.insert_one(entry)
+        return shard
+
+    def _reclaim_orphan(self, email: str) -> bool:
+        """
+        Drop the email's directory entry if it has no user behind it (a signup that
+        died between the two inserts). Entries younger than ORPHAN_GRACE_SECONDS may
+        belong to a signup still in flight and are left alone. True if it is gone.
+        """
+        existing = self.home.user_directory.find_one({"email": email})
+        if existing is None:
+            return True
+        created_at = existing.get("created_at")
+        if created_at is None:
+            return False
+        if created_at.tzinfo is None:
+            created_at = created_at.replace(tzinfo=timezone.utc)
+        if datetime.now(timezone.utc) - created_at < timedelta(seconds=ORPHAN_GRACE_SECONDS):
+            return False
+        if self.shard_for_entry(existing).users.find_one({"email": email}, {"_id": 1}):
+            return False
+        self.home.user_directory.delete_one({"_id": existing["_id"], "email": email})
+        print(f"Reclaimed orphaned directory entry {existing['_id']} for {email}")
+        return True
+
+    def unregister_user(self, user_id: str):
+        """Drop a directory entry, e.g. when creating the user itself failed"""
+        if self.sharded:
+            self.home.user_directory.delete_one({"_id": user_id})
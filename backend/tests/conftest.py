@@ -0,0 +1,21 @@
+import os
+import sys
+
+# The backend runs as flat modules (see main.py); importing database needs a URI,
+# but MongoClient(connect=False) never dials it
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("MONGO_URI", "mongodb://localhost:27017")
+
+import pytest
+
+import database
+from fakes import FakeDatabase
+
+
+@pytest.fixture
+def fake_db():
+    """Route every shard lookup to one in-memory database; restore real clients afterwards"""
+    db = FakeDatabase()
+    database.shard_router.configure({"default": db})
+    yield db
+    database.reconnect()
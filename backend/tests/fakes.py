@@ -0,0 +1,196 @@
+"""
+In-memory stand-in for the subset of the pymongo API the backend uses
+
+Every collection method call is one simulated round-trip and is logged on the
+database (db.calls), so tests can assert how many trips an endpoint makes.
+"""
+import copy
+from types import SimpleNamespace
+
+from bson import ObjectId
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+
+def _matches(doc, query):
+    for key, condition in query.items():
+        value = doc.get(key)
+        if isinstance(condition, dict) and any(k.startswith("$") for k in condition):
+            for op, arg in condition.items():
+                if op == "$in" and value not in arg:
+                    return False
+                if op == "$exists" and (key in doc) != arg:
+                    return False
+                if op == "$gt" and not (value is not None and value > arg):
+                    return False
+                if op == "$gte" and not (value is not None and value >= arg):
+                    return False
+                if op == "$lt" and not (value is not None and value < arg):
+                    return False
+                if op == "$lte" and not (value is not None and value <= arg):
+                    return False
+        elif value != condition:
+            return False
+    return True
+
+def _apply(doc, update, inserting):
+    for key, value in update.get("$set", {}).items():
+        doc[key] = value
+    for key in update.get("$unset", {}):
+        doc.pop(key, None)
+    for key, value in update.get("$inc", {}).items():
+        doc[key] = doc.get(key, 0) + value
+    if inserting:
+        for key, value in update.get("$setOnInsert", {}).items():
+            doc[key] = value
+
+
+class FakeCursor(list):
+    def sort(self, key, direction=1):
+        if isinstance(key, list):
+            key, direction = key[0]
+        super().sort(key=lambda doc: doc.get(key), reverse=direction < 0)
+        return self
+
+
+class FakeCollection:
+    def __init__(self, db, name):
+        self.db = db
+        self.name = name
+        self.docs = []
+        self.unique = []
+
+    def _trip(self, method):
+        self.db.calls.append((self.name, method))
+
+    def _check_unique(self, doc, ignore=None):
+        for fields in self.unique:
+            for other in self.docs:
+                if other is not ignore and all(other.get(f) == doc.get(f) for f in fields):
+                    raise DuplicateKeyError(f"E11000 duplicate key in {self.name}: {fields}")
+
+    def _insert(self, doc):
+        doc.setdefault("_id", ObjectId())
+        self._check_unique(doc)
+        self.docs.append(copy.deepcopy(doc))
+        return doc["_id"]
+
+    def _upsert(self, query, update):
+        doc = {k: v for k, v in query.items() if not isinstance(v, dict)}
+        _apply(doc, update, inserting=True)
+        return self._insert(doc)
+
+    def create_index(self, keys, unique=False, **kwargs):
+        if unique:
+            self.unique.append([keys] if isinstance(keys, str) else [k for k, _ in keys])
+
+    def insert_one(self, doc, session=None):
+        self._trip("insert_one")
+        return SimpleNamespace(inserted_id=self._insert(doc))
+
+    def find(self, query=None, projection=None, session=None, sort=None):
+        self._trip("find")
+        return FakeCursor(copy.deepcopy(d) for d in self.docs if _matches(d, query or {}))
+
+    def find_one(self, query=None, projection=None, session=None, sort=None):
+        self._trip("find_one")
+        found = FakeCursor(d for d in self.docs if _matches(d, query or {}))
+        if sort:
+            found.sort(sort)
+        return copy.deepcopy(found[0]) if found else None
+
+    def find_one_and_update(self, query, update, return_document=ReturnDocument.BEFORE, session=None):
+        self._trip("find_one_and_update")
+        for doc in self.docs:
+            if _matches(doc, query):
+                before = copy.deepcopy(doc)
+                _apply(doc, update, inserting=False)
+                return copy.deepcopy(doc) if return_document == ReturnDocument.AFTER else before
+        return None
+
+    def update_one(self, query, update, upsert=False, session=None):
+        self._trip("update_one")
+        for doc in self.docs:
+            if _matches(doc, query):
+                _apply(doc, update, inserting=False)
+                self._check_unique(doc, ignore=doc)
+                return SimpleNamespace(matched_count=1, upserted_id=None)
+        upserted_id = self._upsert(query, update) if upsert else None
+        return SimpleNamespace(matched_count=0, upserted_id=upserted_id)
+
+    def delete_one(self, query, session=None):
+        self._trip("delete_one")
+        for doc in self.docs:
+            if _matches(doc, query):
+                self.docs.remove(doc)
+                return SimpleNamespace(deleted_count=1)
+        return SimpleNamespace(deleted_count=0)
+
+    def delete_many(self, query, session=None):
+        self._trip("delete_many")
+        kept = [d for d in self.docs if not _matches(d, query)]
+        deleted, self.docs = len(self.docs) - len(kept), kept
+        return SimpleNamespace(deleted_count=deleted)
+
+    def count_documents(self, query, session=None):
+        self._trip("count_documents")
+        return sum(1 for d in self.docs if _matches(d, query))
+
+    def distinct(self, key, query=None, session=None):
+        self._trip("distinct")
+        return sorted({d.get(key) for d in self.docs if _matches(d, query or {})})
+
+    def aggregate(self, pipeline, session=None):
+        """Only $match, $group (by one field, with $sum), $sort and $limit"""
+        self._trip("aggregate")
+        docs = copy.deepcopy(self.docs)
+        for stage in pipeline:
+            (op, arg), = stage.items()
+            if op == "$match":
+                docs = [d for d in docs if _matches(d, arg)]
+            elif op == "$group":
+                groups = {}
+                for doc in docs:
+                    key = doc.get(arg["_id"][1:])
+                    group = groups.setdefault(key, {"_id": key})
+                    for field, acc in arg.items():
+                        if field != "_id":
+                            value = acc["$sum"]
+                            group[field] = group.get(field, 0) + (doc.get(value[1:], 0) if isinstance(value, str) else value)
+                docs = list(groups.values())
+            elif op == "$sort":
+                for field, direction in reversed(list(arg.items())):
+                    docs.sort(key=lambda d: d.get(field), reverse=direction < 0)
+            elif op == "$limit":
+                docs = docs[:arg]
+            else:
+                raise NotImplementedError(f"{op} is not supported by the fake")
+        return FakeCursor(docs)
+
+    def bulk_write(self, requests, ordered=True, session=None):
+        self._trip("bulk_write")
+        for request in requests:
+            # Only ReplaceOne is used (rebalance); it keeps its arguments in private attributes
+            query, doc, upsert = request._filter, request._doc, request._upsert
+            existing = next((d for d in self.docs if _matches(d, query)), None)
+            if existing is not None:
+                self.docs.remove(existing)
+                self._insert(copy.deepcopy(doc))
+            elif upsert:
+                self._insert(copy.deepcopy(doc))
+
+
+class FakeDatabase:
+    def __init__(self, name="fake"):
+        self.name = name
+        self.calls = []
+        self._collections = {}
+
+    def __getitem__(self, name):
+        if name not in self._collections:
+            self._collections[name] = FakeCollection(self, name)
+        return self._collections[name]
+
+    def command(self, *args, **kwargs):
+        self.calls.append(("$cmd", args[0] if args else None))
+        return {"ok": 1}
@@ -0,0 +1,107 @@
+import threading
+import time
+
+import pytest
+
+from batching import Batcher
+from deadline import DeadlineExceeded, remaining, request_deadline
+
+
+class _Loader:
+    """load_many whose first batch ("busy") blocks until released, so later callers batch up"""
+
+    def __init__(self, delay=0.0):
+        self.delay = delay
+        self.release = threading.Event()
+        self.budgets = {}
+
+    def load_many(self, keys):
+        if "busy" in keys:
+            self.release.wait(5)
+        else:
+            self.budgets[tuple(sorted(keys))] = remaining()
+            time.sleep(self.delay)
+        return {key: key.upper() for key in keys}
+
+
+def _in_thread(fn):
+    result = {}
+
+    def run():
+        try:
+            result["value"] = fn()
+        except Exception as e:
+            result["error"] = e
+    thread = threading.Thread(target=run)
+    thread.start()
+    return thread, result
+
+
+def _batched_pair(loader, first, second):
+    """Run two lookups as one batch while another batch is in flight"""
+    batcher = Batcher(loader.load_many, max_batch_size=2, max_wait=5)
+    busy, _ = _in_thread(lambda: batcher.load("busy"))
+    time.sleep(0.05)
+    threads = [_in_thread(first(batcher))]
+    time.sleep(0.05)
+    threads.append(_in_thread(second(batcher)))
+    for thread, _ in threads:
+        thread.join(5)
+    loader.release.set()
+    busy.join(5)
+    return [result for _, result in threads]
+
+
+def _with_deadline(seconds, key):
+    def lookup(batcher):
+        def run():
+            with request_deadline(seconds):
+                return batcher.load(key)
+        return run
+    return lookup
+
+
+def test_a_batch_runs_under_the_latest_callers_deadline():
+    loader = _Loader()
+
+    short, long = _batched_pair(loader, _with_deadline(0.5, "a"), _with_deadline(3, "b"))
+
+    assert short == {"value": "A"} and long == {"value": "B"}
+    assert 2 < loader.budgets[("a", "b")] <= 3
+
+
+def test_a_batch_has_no_deadline_when_a_caller_has_none():
+    loader = _Loader()
+
+    _batched_pair(loader, _with_deadline(0.5, "a"), lambda batcher: lambda: batcher.load("b"))
+
+    assert loader.budgets[("a", "b")] is None
+
+
+def test_each_caller_stops_waiting_at_its_own_deadline():
+    loader = _Loader(delay=0.5)
+
+    patient, hurried = _batched_pair(loader, lambda batcher: lambda: batcher.load("a"), _with_deadline(0.1, "b"))
+
+    assert patient == {"value": "A"}
+    assert isinstance(hurried["error"], DeadlineExceeded)
+
+
+def test_concurrent_lookups_share_round_trips():
+    loader = _Loader(delay=0.02)
+    batcher = Batcher(loader.load_many, max_batch_size=100, max_wait=0.01)
+    threads = [_in_thread(lambda k=k: batcher.load(f"k{k}")) for k in range(50)]
+    for thread, _ in threads:
+        thread.join(5)
+
+    assert [result["value"] for _, result in threads] == [f"K{k}" for k in range(50)]
+    assert batcher.loads == 50 and batcher.batches < 50
+
+
+def test_load_errors_reach_every_caller():
+    def broken(keys):
+        raise RuntimeError("database down")
+    batcher = Batcher(broken)
+
+    with pytest.raises(RuntimeError):
+        batcher.load("a")
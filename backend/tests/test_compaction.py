@@ -0,0 +1,85 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from bson import ObjectId
+
+import database
+from compaction import compact_days_log, compact_user_year, retention_cutoff
+from models import UserResponse
+from routes.habits import get_calendar_data, habit_insights
+
+USER = UserResponse(id=str(ObjectId()), email="gardener@example.com", full_name="Gardener", is_active=True)
+TODAY = datetime.now(timezone.utc).date()
+
+
+def _log(db, *days, user_id=USER.id):
+    for day in days:
+        db["days_log"].docs.append({"_id": ObjectId(), "user_id": user_id, "date": str(day)})
+
+
+def _old_days():
+    # 12 old rows over 10 days (two days logged twice), all before any cutoff of 400 days
+    start = TODAY - timedelta(days=600)
+    days = [start + timedelta(days=n) for n in range(10)]
+    return days + days[:2]
+
+
+def _summaries(db):
+    return sorted(db["days_log_summaries"].docs, key=lambda s: s["year"])
+
+
+def test_old_rows_are_folded_into_yearly_summaries(fake_db):
+    old = _old_days()
+    recent = [TODAY - timedelta(days=n) for n in range(5)]
+    _log(fake_db, *old, *recent)
+
+    removed = compact_days_log(retention_days=400, batch_size=3)
+
+    assert removed == len(old)
+    summaries = _summaries(fake_db)
+    assert sum(s["count"] for s in summaries) == 12
+    assert sum(s["active_days"] for s in summaries) == 10
+    assert sorted(d["date"] for d in fake_db["days_log"].docs) == sorted(str(d) for d in recent)
+
+
+def test_an_interrupted_run_resumes_without_double_counting(fake_db):
+    _log(fake_db, *_old_days())
+    year = str(_old_days()[0].year)
+    cutoff = retention_cutoff(400)
+    days_log = fake_db["days_log"]
+
+    def dies(*args, **kwargs):
+        raise RuntimeError("compaction killed")
+    days_log.delete_many = dies
+    with pytest.raises(RuntimeError):
+        compact_user_year(database.shard_router.home, USER.id, year, cutoff, batch_size=3)
+    del days_log.delete_many
+    # The first batch is counted but its rows are still there, below compacted_through
+    assert fake_db["days_log_summaries"].docs[0]["count"] > 0
+
+    compact_days_log(retention_days=400, batch_size=3)
+
+    summaries = _summaries(fake_db)
+    assert sum(s["count"] for s in summaries) == 12
+    assert sum(s["active_days"] for s in summaries) == 10
+    assert fake_db["days_log"].docs == []
+
+
+def test_insights_and_calendar_are_unchanged_by_compaction(fake_db):
+    _log(fake_db, *_old_days(), *[TODAY - timedelta(days=n) for n in (0, 3, 364, 370, 399)])
+    shard = database.shard_router.home
+    insights = habit_insights(current_user=USER, shard=shard)
+    calendar = get_calendar_data(current_user=USER, shard=shard)
+
+    assert compact_days_log(retention_days=400) == 12
+
+    assert habit_insights(current_user=USER, shard=shard)["total_streaks"] == insights["total_streaks"] == 17
+    after = get_calendar_data(current_user=USER, shard=shard)
+    assert after == calendar
+    assert len(after["calendar"]) == 365
+    assert sum(day["count"] for day in after["calendar"]) == 3
+
+
+def test_retention_inside_the_heatmap_window_is_refused():
+    with pytest.raises(ValueError):
+        retention_cutoff(300)
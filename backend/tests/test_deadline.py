@@ -0,0 +1,54 @@
+import asyncio
+import time
+
+from pymongo.errors import ExecutionTimeout
+
+from circuit_breaker import CircuitBreaker
+from deadline import DeadlineMiddleware, remaining, request_deadline
+
+
+def _timeout():
+    raise ExecutionTimeout("operation exceeded time limit")
+
+
+def _fail(breaker, times):
+    for _ in range(times):
+        try:
+            breaker.call(_timeout)
+        except ExecutionTimeout:
+            pass
+
+
+def test_a_caller_shortened_budget_running_out_does_not_open_the_circuit():
+    breaker = CircuitBreaker("test", failure_threshold=5)
+    with request_deadline(0.01, caller_chosen=True):
+        time.sleep(0.02)
+        _fail(breaker, 10)
+
+    assert breaker.state == "closed"
+    assert breaker.failures == 0
+
+
+def test_timeouts_within_the_default_budget_still_open_the_circuit():
+    breaker = CircuitBreaker("test", failure_threshold=5)
+    with request_deadline(0.01):
+        time.sleep(0.02)
+        _fail(breaker, 5)
+
+    assert breaker.state == "open"
+
+
+def _budget_for(header_ms, budget_ms=8000):
+    seen = []
+
+    async def app(scope, receive, send):
+        seen.append(remaining())
+    scope = {"type": "http", "headers": [(b"x-request-deadline-ms", str(header_ms).encode())]}
+    asyncio.run(DeadlineMiddleware(app, budget_ms)(scope, None, None))
+    return seen[0]
+
+
+def test_header_budget_is_clamped_between_the_floor_and_the_default():
+    assert 0.9 < _budget_for(1) <= 1.0
+    assert 2.9 < _budget_for(3000) <= 3.0
+    assert 7.9 < _budget_for(60000) <= 8.0
@@ -0,0 +1,119 @@
+"""Tail behaviour offline: a Shard over FaultyDatabase(FakeDatabase())"""
+import time
+
+import pytest
+from pymongo.errors import AutoReconnect, ExecutionTimeout
+
+from circuit_breaker import CircuitBreaker, CircuitOpenError, GuardedCursor, StaleCache
+from deadline import request_deadline
+from fakes import FakeDatabase
+from fault_injection import FaultInjector, FaultyDatabase
+from sharding import Shard
+
+RESET = 0.05
+
+
+@pytest.fixture
+def injector():
+    return FaultInjector(error_rate=1.0, seed=1)
+
+
+@pytest.fixture
+def shard(injector):
+    db = FakeDatabase()
+    db["habits"].docs.append({"_id": 1, "user_id": "u"})
+    return Shard("s0", FaultyDatabase(db, injector), breaker=CircuitBreaker("shard s0", failure_threshold=3, reset_timeout=RESET))
+
+
+def _fail(call, times=1):
+    for _ in range(times):
+        with pytest.raises(AutoReconnect):
+            call()
+
+
+def _open(shard):
+    _fail(lambda: shard.habits.find_one({"user_id": "u"}), 3)
+    assert shard.breaker.state == "open"
+
+
+def test_circuit_opens_after_the_threshold_and_fails_fast(shard):
+    _open(shard)
+    calls = len(shard.db._db.calls)
+
+    with pytest.raises(CircuitOpenError):
+        shard.habits.find_one({"user_id": "u"})
+    assert len(shard.db._db.calls) == calls
+
+
+def test_failing_finds_count_against_the_breaker(shard):
+    _fail(lambda: shard.habits.find({"user_id": "u"}), 3)
+
+    assert shard.breaker.state == "open"
+
+
+def test_successful_probe_closes_the_circuit(shard, injector):
+    _open(shard)
+    time.sleep(RESET)
+    injector.error_rate = 0
+
+    assert shard.habits.find_one({"user_id": "u"})["_id"] == 1
+    assert shard.breaker.state == "closed" and shard.breaker.failures == 0
+
+
+def test_failed_probe_opens_the_circuit_again(shard):
+    _open(shard)
+    time.sleep(RESET)
+
+    _fail(lambda: shard.habits.find_one({"user_id": "u"}))
+    assert shard.breaker.state == "open"
+    with pytest.raises(CircuitOpenError):
+        shard.habits.find_one({"user_id": "u"})
+
+
+def test_a_find_failing_as_the_probe_does_not_wedge_the_circuit(shard, injector):
+    _open(shard)
+    time.sleep(RESET)
+    _fail(lambda: shard.habits.find({"user_id": "u"}))
+    time.sleep(RESET)
+    injector.error_rate = 0
+
+    assert list(shard.habits.find({"user_id": "u"}))
+    assert shard.breaker.state == "closed"
+
+
+def test_a_cursor_closed_before_its_first_fetch_gives_back_the_probe():
+    breaker = CircuitBreaker("test", failure_threshold=1, reset_timeout=0)
+    breaker.record_failure()
+    breaker.allow()
+
+    class Unread:
+        def close(self):
+            pass
+    with GuardedCursor(Unread(), breaker):
+        pass
+
+    breaker.allow()
+    assert breaker.state == "half_open"
+
+
+def test_injected_latency_ends_in_execution_timeout_at_the_deadline(injector):
+    injector.error_rate = 0
+    injector.latency_ms = 500
+    shard = Shard("s0", FaultyDatabase(FakeDatabase(), injector))
+
+    start = time.monotonic()
+    with request_deadline(0.05), pytest.raises(ExecutionTimeout):
+        shard.habits.find_one({})
+
+    assert time.monotonic() - start < 0.3
+
+
+def test_stale_cache_serves_the_last_good_value(shard, injector):
+    cache = StaleCache(enabled=True)
+    injector.error_rate = 0
+    assert cache.serve("habits", lambda: shard.habits.find_one({"user_id": "u"}))["_id"] == 1
+
+    injector.error_rate = 1.0
+    assert cache.serve("habits", lambda: shard.habits.find_one({"user_id": "u"}))["_id"] == 1
+    with pytest.raises(AutoReconnect):
+        cache.serve("other", lambda: shard.habits.find_one({"user_id": "u"}))
@@ -0,0 +1,97 @@
+import random
+from datetime import date, datetime, timedelta, timezone
+
+import pytest
+from bson import ObjectId
+from fastapi import HTTPException
+
+import database
+from history import count_completions, record_completion, split_range
+from models import UserResponse
+from routes.habits import habit_history
+
+USER = UserResponse(id=str(ObjectId()), email="gardener@example.com", full_name="Gardener", is_active=True)
+TODAY = datetime.now(timezone.utc).date()
+
+
+def _days(start, end):
+    return [start + timedelta(days=n) for n in range((end - start).days + 1)]
+
+def _month_days(key):
+    year, month = map(int, key.split("-"))
+    first = date(year, month, 1)
+    following = date(year + month // 12, month % 12 + 1, 1)
+    return _days(first, following - timedelta(days=1))
+
+def _week_days(key):
+    year, week = key.split("-W")
+    monday = date.fromisocalendar(int(year), int(week), 1)
+    return _days(monday, monday + timedelta(days=6))
+
+def _random_range(rng):
+    start = date(2019, 1, 1) + timedelta(days=rng.randrange(4000))
+    return start, start + timedelta(days=rng.randrange(800))
+
+
+def test_split_range_covers_every_day_exactly_once():
+    rng = random.Random(42)
+    for _ in range(3000):
+        start, end = _random_range(rng)
+        months, weeks, days = split_range(start, end)
+
+        covered = [d for k in months for d in _month_days(k)] + [d for k in weeks for d in _week_days(k)]
+        covered += [date.fromisoformat(d) for d in days]
+        assert sorted(covered) == _days(start, end), (start, end)
+        # Whole periods are used wherever they fit, so only a few weeks of edge days remain
+        assert len(days) <= 26, (start, end)
+
+
+def test_count_completions_matches_counting_every_event(fake_db):
+    rng = random.Random(7)
+    shard = database.shard_router.home
+    completed = sorted(rng.sample(_days(date(2024, 1, 1), date(2026, 12, 31)), 400))
+    for day in completed:
+        record_completion(shard, USER.id, "h", day)
+
+    for _ in range(300):
+        start = date(2023, 12, 1) + timedelta(days=rng.randrange(1100))
+        end = start + timedelta(days=rng.randrange(500))
+        assert count_completions(shard, "h", start, end) == sum(start <= d <= end for d in completed)
+
+
+def _habit(db, created):
+    habit_id = ObjectId.from_datetime(datetime.combine(created, datetime.min.time(), timezone.utc))
+    db["habits"].docs.append({"_id": habit_id, "user_id": USER.id, "name": "Water", "streak": 0})
+    return str(habit_id)
+
+
+def test_history_endpoint_counts_a_range_in_a_bounded_number_of_trips(fake_db):
+    shard = database.shard_router.home
+    habit_id = _habit(fake_db, TODAY - timedelta(days=800))
+    for n in range(0, 700, 3):
+        record_completion(shard, USER.id, habit_id, TODAY - timedelta(days=n))
+    fake_db.calls.clear()
+
+    result = habit_history(habit_id, start=TODAY - timedelta(days=600), end=TODAY, current_user=USER, shard=shard)
+
+    assert result["completions"] == sum(1 for n in range(0, 700, 3) if n <= 600)
+    # Habit lookup, one rollup query and (unless the range is aligned) one edge-day count
+    assert len(fake_db.calls) <= 3
+
+
+def test_history_starts_no_earlier_than_the_habit(fake_db):
+    habit_id = _habit(fake_db, TODAY - timedelta(days=30))
+
+    result = habit_history(habit_id, start=date(1, 1, 1), end=None, current_user=USER, shard=database.shard_router.home)
+
+    assert result["start"] == str(TODAY - timedelta(days=30))
+
+
+def test_history_refuses_overlong_and_inverted_ranges(fake_db):
+    habit_id = _habit(fake_db, date(2000, 1, 1))
+    shard = database.shard_router.home
+
+    for start, end in ((date(1, 1, 1), None), (TODAY, TODAY - timedelta(days=1))):
+        with pytest.raises(HTTPException) as exc:
+            habit_history(habit_id, start=start, end=end, current_user=USER, shard=shard)
+        assert exc.value.status_code == 400
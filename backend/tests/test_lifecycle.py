@@ -0,0 +1,53 @@
+import asyncio
+import signal
+
+from lifecycle import Lifecycle
+
+
+def test_sigterm_marks_draining_before_the_server_hears_of_it():
+    received = []
+    previous = signal.signal(signal.SIGTERM, lambda signum, frame: received.append(signum))
+
+    async def scenario():
+        lifecycle = Lifecycle()
+        lifecycle.install_signal_handler(delay=0.2)
+        signal.raise_signal(signal.SIGTERM)
+        await asyncio.sleep(0.05)
+        draining_early, forwarded_early = lifecycle.draining, list(received)
+        await asyncio.sleep(0.3)
+        return draining_early, forwarded_early
+
+    try:
+        draining_early, forwarded_early = asyncio.run(scenario())
+    finally:
+        signal.signal(signal.SIGTERM, previous)
+
+    assert draining_early and forwarded_early == []
+    assert received == [signal.SIGTERM]
+
+
+def test_drain_waits_for_tracked_tasks():
+    done = []
+
+    async def scenario():
+        lifecycle = Lifecycle()
+
+        async def send_email():
+            await asyncio.sleep(0.05)
+            done.append("sent")
+        lifecycle.track(send_email())
+        return await lifecycle.drain(timeout=1)
+
+    assert asyncio.run(scenario())
+    assert done == ["sent"]
+
+
+def test_drain_cancels_tasks_after_the_timeout():
+    async def scenario():
+        lifecycle = Lifecycle()
+        task = lifecycle.track(asyncio.sleep(10))
+        finished = await lifecycle.drain(timeout=0.05)
+        await asyncio.sleep(0)
+        return finished, task.cancelled()
+
+    assert asyncio.run(scenario()) == (False, True)
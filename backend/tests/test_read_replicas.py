@@ -0,0 +1,85 @@
+"""
+Replica reads against a real replica set (skipped when none is reachable)
+
+Start one locally with e.g.
+    mongod --replSet rs0 --port 27017 --dbpath /tmp/rs0 &
+    mongosh --eval 'rs.initiate()'
+and point TEST_REPLICA_SET_URI at it. The primary-load test needs a secondary.
+"""
+import os
+import uuid
+
+import pytest
+from bson import ObjectId
+from pymongo import MongoClient
+from pymongo.errors import PyMongoError
+from pymongo.read_preferences import SecondaryPreferred
+
+from sessions import read_session, write_session
+from sharding import ShardRouter
+
+REPLICA_SET_URI = os.getenv("TEST_REPLICA_SET_URI", "mongodb://localhost:27017/?replicaSet=rs0")
+READS = 200
+
+
+@pytest.fixture(scope="module")
+def replica_set():
+    client = MongoClient(REPLICA_SET_URI, serverSelectionTimeoutMS=1000)
+    try:
+        hello = client.admin.command("hello")
+    except PyMongoError:
+        client.close()
+        pytest.skip(f"No replica set reachable at {REPLICA_SET_URI}")
+    if "setName" not in hello:
+        client.close()
+        pytest.skip(f"{REPLICA_SET_URI} is not a replica set")
+    yield client, hello
+    client.close()
+
+
+@pytest.fixture
+def shard(replica_set):
+    client, _ = replica_set
+    name = f"habit_garden_test_{uuid.uuid4().hex[:8]}"
+    router = ShardRouter(
+        {"rs": client[name]},
+        read_databases={"rs": client.get_database(name, read_preference=SecondaryPreferred())}
+    )
+    yield router.home
+    client.drop_database(name)
+
+
+def _primary_queries(client):
+    return client.admin.command("serverStatus")["opcounters"]["query"]
+
+
+def test_user_reads_their_own_writes_from_replicas(shard):
+    user_id = str(ObjectId())
+    for n in range(1, 21):
+        with write_session(shard, user_id) as session:
+            shard.habits.insert_one({"user_id": user_id, "name": f"habit {n}"}, session=session)
+        with read_session(shard, user_id) as session:
+            assert shard.reader.habits.count_documents({"user_id": user_id}, session=session) == n
+
+
+def test_replica_reads_take_load_off_the_primary(replica_set, shard):
+    client, hello = replica_set
+    if len(hello.get("hosts", [])) < 2:
+        pytest.skip("The replica set has no secondary to read from")
+    user_id = str(ObjectId())
+    with write_session(shard, user_id) as session:
+        shard.habits.insert_one({"user_id": user_id, "name": "water"}, session=session)
+
+    before = _primary_queries(client)
+    for _ in range(READS):
+        with read_session(shard, user_id) as session:
+            assert shard.reader.habits.find_one({"user_id": user_id}, session=session)
+    replica_reads = _primary_queries(client) - before
+
+    before = _primary_queries(client)
+    for _ in range(READS):
+        shard.habits.find_one({"user_id": user_id})
+    primary_reads = _primary_queries(client) - before
+
+    assert primary_reads >= READS
+    assert replica_reads < READS // 10
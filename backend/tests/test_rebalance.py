@@ -0,0 +1,86 @@
+from types import SimpleNamespace
+
+import pytest
+from bson import ObjectId
+from fastapi import HTTPException
+
+import database
+from auth import get_writable_user_shard
+from fakes import FakeDatabase
+from rebalance import move_user
+
+
+@pytest.fixture
+def router(fake_db):
+    target = FakeDatabase("s1")
+    for db in (fake_db, target):
+        db["habit_rollups"].create_index([("habit_id", 1), ("key", 1)], unique=True)
+    database.shard_router.configure({"s0": fake_db, "s1": target})
+    return database.shard_router
+
+
+def _seed_user(router):
+    user_id = ObjectId()
+    home = router.home.db
+    home["users"].docs.append({"_id": user_id, "email": "mover@example.com"})
+    home["habits"].docs.append({"_id": ObjectId(), "user_id": str(user_id), "streak": 2})
+    home["habit_rollups"].docs.append({"_id": ObjectId(), "user_id": str(user_id), "habit_id": "h", "key": "2026-10", "count": 2})
+    return str(user_id)
+
+
+def _user_docs(db, user_id):
+    return len(db["users"].docs) + len(db["habits"].docs) + len(db["habit_rollups"].docs)
+
+
+def test_move_copies_flips_and_cleans_up(router):
+    user_id = _seed_user(router)
+
+    assert move_user(router, user_id, "s1", grace=0)
+
+    entry = router.home.db["user_directory"].docs[0]
+    assert entry["shard"] == "s1"
+    assert "moving_to" not in entry and "moved_from" not in entry
+    assert _user_docs(router.shards["s1"].db, user_id) == 3
+    assert _user_docs(router.home.db, user_id) == 0
+    assert not move_user(router, user_id, "s1", grace=0)
+
+
+def test_rerun_finishes_a_move_that_died_after_the_copy(router):
+    user_id = _seed_user(router)
+    target = router.shards["s1"].db
+    target_bulk_write = target["habit_rollups"].bulk_write
+
+    def dies_after_copy(*args, **kwargs):
+        target_bulk_write(*args, **kwargs)
+        raise RuntimeError("mover killed")
+    target["habit_rollups"].bulk_write = dies_after_copy
+    with pytest.raises(RuntimeError):
+        move_user(router, user_id, "s1", grace=0)
+    del target["habit_rollups"].bulk_write
+
+    # Still frozen on the source, and the partial copy does not trip the unique index
+    assert router.home.db["user_directory"].docs[0]["moving_to"] == "s1"
+    assert move_user(router, user_id, "s1", grace=0)
+    assert target["habit_rollups"].docs[0]["count"] == 2
+    assert _user_docs(router.home.db, user_id) == 0
+
+
+def test_rerun_deletes_the_source_left_behind_after_the_flip(router):
+    user_id = _seed_user(router)
+    move_user(router, user_id, "s1", grace=0)
+    # As if the mover died between the flip and the source cleanup
+    router.home.db["user_directory"].docs[0]["moved_from"] = "s0"
+    router.home.db["habits"].docs.append({"_id": ObjectId(), "user_id": user_id})
+
+    assert not move_user(router, user_id, "s1", grace=0)
+    assert _user_docs(router.home.db, user_id) == 0
+    assert "moved_from" not in router.home.db["user_directory"].docs[0]
+
+
+def test_writes_are_refused_while_the_user_is_moving(router):
+    request = SimpleNamespace(state=SimpleNamespace(user_shard="s0", user_moving=True))
+
+    with pytest.raises(HTTPException) as exc:
+        get_writable_user_shard(request, shard=router.home)
+
+    assert exc.value.status_code == 503
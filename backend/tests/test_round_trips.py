@@ -0,0 +1,86 @@
+"""Database round-trips made by the signup and habit write endpoints"""
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from bson import ObjectId
+from fastapi import HTTPException
+
+import database
+from fakes import FakeDatabase
+from models import Habit, UserCreate, UserResponse
+from routes.auth import signup
+from routes.habits import add_habit, grow_habit, update_habit
+
+USER = UserResponse(id=str(ObjectId()), email="gardener@example.com", full_name="Gardener", is_active=True)
+
+
+def _seed_habit(db, **fields):
+    habit = {"_id": ObjectId(), "user_id": USER.id, "name": "Water", "description": "Daily", "streak": 0, **fields}
+    db["habits"].docs.append(habit)
+    return str(habit["_id"])
+
+
+def test_signup_is_one_insert(fake_db):
+    created = asyncio.run(signup(UserCreate(email="new@example.com", full_name="New", password="secret")))
+
+    assert fake_db.calls == [("users", "insert_one")]
+    assert fake_db["users"].docs[0]["_id"] == ObjectId(created.id)
+
+
+def test_signup_rejects_pre_sharding_email_before_backfill(fake_db):
+    fake_db["users"].docs.append({"_id": ObjectId(), "email": "old@example.com", "full_name": "Old"})
+    database.shard_router.configure({"s0": fake_db, "s1": FakeDatabase("s1")})
+
+    with pytest.raises(HTTPException) as exc:
+        asyncio.run(signup(UserCreate(email="old@example.com", full_name="Again", password="secret")))
+
+    assert exc.value.status_code == 400
+    assert len(fake_db["users"].docs) == 1
+
+
+def test_add_habit_is_one_insert(fake_db):
+    created = add_habit(Habit(name="Water", description="Daily"), current_user=USER, shard=database.shard_router.home)
+
+    assert fake_db.calls == [("habits", "insert_one")]
+    assert created["_id"] == str(fake_db["habits"].docs[0]["_id"])
+    assert created["user_id"] == USER.id
+
+
+def test_update_habit_is_one_find_one_and_update(fake_db):
+    habit_id = _seed_habit(fake_db)
+
+    updated = update_habit(habit_id, Habit(name="Water twice", description="Daily"), current_user=USER, shard=database.shard_router.home)
+
+    assert fake_db.calls == [("habits", "find_one_and_update")]
+    assert updated["name"] == "Water twice"
+
+
+def test_grow_habit_round_trips(fake_db):
+    yesterday = datetime.now(timezone.utc) - timedelta(days=1)
+    habit_id = _seed_habit(fake_db, streak=3, last_streak_date=yesterday)
+
+    grown = grow_habit(habit_id, current_user=USER, shard=database.shard_router.home)
+
+    # Habit lookup, event, week and month rollups, days_log row, streak update
+    assert len(fake_db.calls) == 6
+    assert fake_db.calls[0] == ("habits", "find")
+    assert fake_db.calls[-1] == ("habits", "find_one_and_update")
+    assert grown["streak"] == 4
+
+
+def test_grow_habit_can_be_retried_after_a_failed_history_write(fake_db):
+    habit_id = _seed_habit(fake_db)
+    rollups = fake_db["habit_rollups"]
+
+    def unavailable(*args, **kwargs):
+        raise RuntimeError("rollup write failed")
+    rollups.update_one = unavailable
+    with pytest.raises(RuntimeError):
+        grow_habit(habit_id, current_user=USER, shard=database.shard_router.home)
+    del rollups.update_one
+
+    assert fake_db["habits"].docs[0]["streak"] == 0
+    grown = grow_habit(habit_id, current_user=USER, shard=database.shard_router.home)
+    assert grown["streak"] == 1
+    assert len(fake_db["habit_events"].docs) == 1
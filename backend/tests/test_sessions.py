@@ -0,0 +1,99 @@
+from types import SimpleNamespace
+
+import pytest
+from bson import Timestamp
+from pymongo.errors import OperationFailure
+
+from sessions import CausalTimes, causal_times, in_transaction, read_session, write_session
+
+
+class _Session:
+    def __init__(self, error=None, cluster_time=None, operation_time=None):
+        self.error = error
+        self.transactions = 0
+        self.cluster_time = cluster_time
+        self.operation_time = operation_time
+        self.advanced = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def advance_cluster_time(self, cluster_time):
+        self.advanced.append(("cluster", cluster_time))
+
+    def advance_operation_time(self, operation_time):
+        self.advanced.append(("operation", operation_time))
+
+    def with_transaction(self, callback):
+        self.transactions += 1
+        if self.error:
+            raise self.error
+        return callback(self)
+
+
+def test_in_transaction_uses_the_session():
+    session = _Session()
+
+    assert in_transaction(session, lambda s: s) is session
+    assert session.transactions == 1
+
+
+def test_in_transaction_falls_back_on_a_standalone_server():
+    session = _Session(OperationFailure("Transaction numbers are only allowed on a replica set member or mongos", code=20))
+
+    assert in_transaction(session, lambda s: "written") == "written"
+
+
+def test_in_transaction_raises_other_failures():
+    session = _Session(OperationFailure("WriteConflict", code=112))
+
+    with pytest.raises(OperationFailure):
+        in_transaction(session, lambda s: "written")
+
+
+def _shard(session):
+    client = SimpleNamespace(start_session=lambda causal_consistency: session)
+    return SimpleNamespace(client=client)
+
+
+def test_causal_times_keep_the_latest_write():
+    times = CausalTimes()
+    times.record("u", {"clusterTime": Timestamp(2, 0)}, Timestamp(2, 0))
+    times.record("u", {"clusterTime": Timestamp(1, 0)}, Timestamp(1, 0))
+    times.record("u", None, None)
+
+    assert times.get("u")[1] == Timestamp(2, 0)
+
+
+def test_causal_times_forget_the_least_recent_user():
+    times = CausalTimes(max_users=2)
+    for n, user in enumerate(["a", "b", "c"], start=1):
+        times.record(user, None, Timestamp(n, 0))
+
+    assert times.get("a") is None
+    assert times.get("c") == (None, Timestamp(3, 0))
+
+
+def test_reads_are_ordered_after_the_same_users_writes():
+    cluster_time = {"clusterTime": Timestamp(7, 1)}
+    with write_session(_shard(_Session(cluster_time=cluster_time, operation_time=Timestamp(7, 1))), "writer"):
+        pass
+
+    reader = _Session()
+    with read_session(_shard(reader), "writer") as session:
+        assert session is reader
+    stranger = _Session()
+    with read_session(_shard(stranger), "someone-else"):
+        pass
+
+    assert reader.advanced == [("cluster", cluster_time), ("operation", Timestamp(7, 1))]
+    assert stranger.advanced == []
+
+
+def test_sessions_are_skipped_without_a_client():
+    with write_session(SimpleNamespace(client=None), "u") as session:
+        assert session is None
+    assert causal_times.get("u") is None
@@ -0,0 +1,93 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from bson import ObjectId
+from fastapi import HTTPException
+
+import database
+from fakes import FakeDatabase
+from models import UserCreate
+from routes.auth import signup
+from sharding import DIRECTORY_BACKFILL
+
+
+@pytest.fixture
+def sharded(fake_db):
+    """Two shards with the production unique indexes, directory already backfilled"""
+    other = FakeDatabase("s1")
+    for db in (fake_db, other):
+        db["users"].create_index("email", unique=True)
+    fake_db["user_directory"].create_index("email", unique=True)
+    fake_db["migrations"].docs.append({"_id": DIRECTORY_BACKFILL})
+    database.shard_router.configure({"s0": fake_db, "s1": other})
+    return database.shard_router
+
+
+def _signup(email, name="Gardener"):
+    return asyncio.run(signup(UserCreate(email=email, full_name=name, password="secret")))
+
+
+def _orphan(router, email, age):
+    router.home.db["user_directory"].docs.append({
+        "_id": str(ObjectId()),
+        "email": email,
+        "shard": "s1",
+        "created_at": datetime.now(timezone.utc) - age,
+    })
+
+
+def test_an_orphaned_directory_entry_is_reclaimed(sharded):
+    _orphan(sharded, "lost@example.com", timedelta(hours=1))
+
+    created = _signup("lost@example.com")
+
+    entries = sharded.home.db["user_directory"].docs
+    assert [e["_id"] for e in entries] == [created.id]
+    assert sharded.shards[entries[0]["shard"]].db["users"].docs[0]["email"] == "lost@example.com"
+
+
+def test_a_fresh_entry_may_belong_to_a_signup_in_flight(sharded):
+    _orphan(sharded, "racing@example.com", timedelta(seconds=1))
+
+    with pytest.raises(HTTPException) as exc:
+        _signup("racing@example.com")
+
+    assert exc.value.status_code == 400
+    assert len(sharded.home.db["user_directory"].docs) == 1
+
+
+def test_duplicate_signup_is_refused_by_the_users_index(fake_db):
+    fake_db["users"].create_index("email", unique=True)
+    _signup("twice@example.com")
+
+    with pytest.raises(HTTPException) as exc:
+        _signup("twice@example.com", name="Impostor")
+
+    assert exc.value.status_code == 400
+    assert [u["full_name"] for u in fake_db["users"].docs] == ["Gardener"]
+
+
+def test_duplicate_signup_is_refused_by_the_directory_when_sharded(sharded):
+    created = _signup("twice@example.com")
+
+    with pytest.raises(HTTPException) as exc:
+        _signup("twice@example.com", name="Impostor")
+
+    assert exc.value.status_code == 400
+    users = [u for shard in sharded.shards.values() for u in shard.db["users"].docs]
+    assert [u["full_name"] for u in users] == ["Gardener"]
+    assert [e["_id"] for e in sharded.home.db["user_directory"].docs] == [created.id]
+
+
+def test_a_user_index_duplicate_leaves_no_directory_entry(sharded, monkeypatch):
+    # A user the directory does not know about, on the shard the new id lands on
+    sharded.home.db["users"].docs.append({"_id": ObjectId(), "email": "hidden@example.com", "full_name": "Hidden"})
+    monkeypatch.setattr(sharded, "ring_shard", lambda user_id: sharded.home)
+
+    with pytest.raises(HTTPException) as exc:
+        _signup("hidden@example.com")
+
+    assert exc.value.status_code == 400
+    assert len(sharded.home.db["users"].docs) == 1
+    assert sharded.home.db["user_directory"].docs == []